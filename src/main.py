@@ -1,10 +1,14 @@
 import argparse
+import cProfile
 from stest import stest
+from stest import profiler
 import os
 from colorama import Fore, Style
 
 def main():
     parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", action="store_true", help="Print the time spent in each phase of the command")
+    parser.add_argument("--profile-output", help="Also dump cProfile stats (pstats format) to the given file")
     subparsers = parser.add_subparsers(dest="command", help="Sub-commands")
 
     # Subparser for init
@@ -25,26 +29,54 @@ def main():
     subparsers.add_parser("status", help="Show status")
 
     # Subparser for create-tests
-    subparsers.add_parser("create-tests", help="Create tests")
+    create_tests_parser = subparsers.add_parser("create-tests", help="Create tests")
+    create_tests_parser.add_argument("-m", "--minify", action="store_true", help="Strip comments and docstrings from the files before sending them")
+    create_tests_parser.add_argument("-p", "--patch", action="store_true", help="Patch the previous test files instead of regenerating them")
+    create_tests_parser.add_argument("-r", "--resume", action="store_true", help="Resume an interrupted run")
+    create_tests_parser.add_argument("-s", "--shard", help="Only create the tests of shard i/N (e.g. 1/4)")
+    create_tests_parser.add_argument("--shard-strategy", choices=["hash", "weight"], default="hash", help="Assign files to shards by path hash or balanced by token weight")
+
+    # Subparser for merge-shards
+    merge_shards_parser = subparsers.add_parser("merge-shards", help="Merge the results of sharded create-tests runs")
+    merge_shards_parser.add_argument("files", nargs="*", help="Shard files to merge (defaults to all files in .stest/shards)")
 
     args = parser.parse_args()
 
+    cprofile = None
+    if args.profile or args.profile_output:
+        profiler.enable()
+    if args.profile_output:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
     app = stest.Stest()
 
     try:
-        if args.command == "init":
-            app.init(args.projectDir, args.output, args.language)
-        elif args.command == "add":
-            app.add(args.files)
-        elif args.command == "remove":
-            app.remove(args.files)
-        elif args.command == "create-tests":
-            app.create_tests()
-        elif args.command == "status":
-            app.status()
+        with profiler.phase(args.command or "stest"):
+            if args.command == "init":
+                app.init(args.projectDir, args.output, args.language)
+            elif args.command == "add":
+                app.add(args.files)
+            elif args.command == "remove":
+                app.remove(args.files)
+            elif args.command == "create-tests":
+                app.create_tests(args.minify, args.patch, args.resume, args.shard, args.shard_strategy)
+            elif args.command == "merge-shards":
+                app.merge_shards(args.files)
+            elif args.command == "status":
+                app.status()
     except Exception as e:
         print(f"{Fore.RED}Error: {Style.RESET_ALL}{e}")
 
+    if cprofile is not None:
+        cprofile.disable()
+        cprofile.dump_stats(args.profile_output)
+
+    if profiler.is_enabled():
+        print("\n" + profiler.report())
+        if cprofile is not None:
+            print(f"cProfile stats have been written to {args.profile_output}.")
+
 
 if __name__ == "__main__":
     main()
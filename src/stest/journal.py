@@ -0,0 +1,201 @@
+########################################################################
+# @file journal.py                                                     #
+# @brief Stest Progress Journal Module                                 #
+#                                                                      #
+# This module implements the write-ahead journal used by create-tests. #
+# Every request sent to the model, every part of a response received,  #
+# every full response and every test file written is appended to the  #
+# journal as soon as it happens, so that an interrupted run can be     #
+# resumed with 'create-tests --resume' without sending the finished    #
+# work again.                                                          #
+#                                                                      #
+# The journal lives in .stest/journal/: entries are appended to        #
+# journal.jsonl (one JSON object per line) and the responses are       #
+# stored next to it, named after their digest.                         #
+#                                                                      #
+########################################################################
+
+import json
+import os
+import shutil
+
+# Local imports
+from . import utils
+
+########################################################################
+
+JOURNAL_FILE = "journal.jsonl"
+
+########################################################################
+
+# @brief Write-ahead journal of a create-tests run
+#
+# @details The journal is only deleted once the run has completed and
+#          the config file has been saved. If it still exists when
+#          create-tests starts, the previous run was interrupted.
+#
+class Journal:
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_file = os.path.join(path, JOURNAL_FILE)
+
+    ###############################
+    # Public methods              #
+    ###############################
+
+    # @brief Checks if the journal of an interrupted run exists
+    # @return True if the journal exists, False otherwise
+    def exists(self) -> bool:
+        return os.path.exists(self.journal_file)
+
+
+    # @brief Deletes the journal and the responses stored with it
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+
+    # @brief Records a request that is about to be sent to the model
+    #
+    # @param request_digest Digest of the prompt and data sent
+    # @param mode "generate" for full test files, "patch" for patches
+    # @param files Dict of the files in the request and their hashes
+    def record_request(self, request_digest: str, mode: str, files: dict[str, str]) -> None:
+        self.__append_entry({
+            "event": "request",
+            "request": request_digest,
+            "mode": mode,
+            "files": files
+        })
+
+
+    # @brief Records a part of the response of a request
+    #
+    # @details Long responses are received in several parts (check
+    #          openai_iface.py/MAX_CONTINUATIONS). Recording each part lets
+    #          an interrupted request be continued instead of sent again.
+    #
+    # @param request_digest Digest of the request
+    # @param part Part of the response
+    def record_response_part(self, request_digest: str, part: str) -> None:
+        self.__append_entry({
+            "event": "response_part",
+            "request": request_digest,
+            "content": part
+        })
+
+
+    # @brief Records the response of a request
+    #
+    # @details The response itself is stored in the journal directory
+    #          so that it can be replayed if the run is interrupted before
+    #          the test files are written.
+    #
+    # @param request_digest Digest of the request
+    # @param response Response from the model
+    # @param truncated Whether the response was cut off
+    # @return Digest of the response
+    def record_response(self, request_digest: str, response: str, truncated: bool = False) -> str:
+        response_digest = utils.get_string_hash(response)
+
+        with open(os.path.join(self.path, response_digest), "w") as f:
+            f.write(response)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.__append_entry({
+            "event": "response",
+            "request": request_digest,
+            "response": response_digest,
+            "truncated": truncated
+        })
+
+        return response_digest
+
+
+    # @brief Records that the test file of a file has been written
+    #
+    # @param file Path to the file
+    # @param file_hash Hash of the file the tests were generated for
+    # @param request_digest Digest of the request
+    # @param response_digest Digest of the response
+    # @param output Path to the test file that was written
+    def record_file(
+            self,
+            file: str,
+            file_hash: str,
+            request_digest: str,
+            response_digest: str,
+            output: str
+    ) -> None:
+        self.__append_entry({
+            "event": "file",
+            "file": file,
+            "hash": file_hash,
+            "request": request_digest,
+            "response": response_digest,
+            "output": output,
+            "output_digest": utils.get_file_hash(output)
+        })
+
+
+    # @brief Loads the journal
+    #
+    # @details An entry that was only partially written (the run was killed
+    #          while appending it) is ignored, along with anything after it.
+    #
+    # @return Dict with the requests ({digest: {"mode", "files", "parts", "response", "truncated"}})
+    #         and the written files ({path: file entry})
+    def load(self) -> dict:
+        journal = {
+            "requests": {},
+            "files": {}
+        }
+
+        if not self.exists():
+            return journal
+
+        with open(self.journal_file, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+
+                if entry["event"] == "request":
+                    journal["requests"][entry["request"]] = {
+                        "mode": entry["mode"],
+                        "files": entry["files"],
+                        "parts": [],
+                        "response": None,
+                        "truncated": False
+                    }
+                elif entry["event"] == "response_part" and entry["request"] in journal["requests"]:
+                    journal["requests"][entry["request"]]["parts"].append(entry["content"])
+                elif entry["event"] == "response" and entry["request"] in journal["requests"]:
+                    journal["requests"][entry["request"]]["response"] = entry["response"]
+                    journal["requests"][entry["request"]]["truncated"] = entry["truncated"]
+                elif entry["event"] == "file":
+                    journal["files"][entry["file"]] = entry
+
+        return journal
+
+
+    # @brief Returns a response stored in the journal
+    # @param response_digest Digest of the response
+    # @return The response
+    def get_response(self, response_digest: str) -> str:
+        return utils.get_file_content(os.path.join(self.path, response_digest))
+
+
+    ###############################
+    # Private methods             #
+    ###############################
+
+    # @brief Appends an entry to the journal and flushes it to disk
+    def __append_entry(self, entry: dict) -> None:
+        utils.create_dir(self.path)
+        with open(self.journal_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
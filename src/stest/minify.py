@@ -0,0 +1,458 @@
+########################################################################
+# @file minify.py                                                      #
+# @brief Stest Source Minification Module                              #
+#                                                                      #
+# This module reduces the source files before they are sent to the     #
+# model. License banners, comment blocks, long docstrings and          #
+# blank-line padding cost tokens (and therefore latency) but do not    #
+# help the model write tests, so they are stripped here.               #
+#                                                                      #
+# Code is never rewritten: only comments and whitespace-only lines     #
+# are removed (Python docstrings are truncated to their summary        #
+# line). Short runs of blank lines are kept and long ones are replaced #
+# by a '<comment> line N' marker, so the original number of every line #
+# can still be read from the minified source.                          #
+#                                                                      #
+# The output is verified before it is used (the token stream of the   #
+# result is compared with the one of the original, with the tokenizer  #
+# for Python and an independent lexer for C-like sources); if the      #
+# verification fails, or the source uses a construct the scanner does  #
+# not understand, the original content is returned untouched.          #
+#                                                                      #
+########################################################################
+
+import ast
+import io
+import re
+import tokenize
+
+########################################################################
+
+# Languages that share the C comment syntax (// and /* */)
+C_LIKE_LANGUAGES = ("c", "cpp", "js")
+
+# Quote characters that open a string literal in C-like languages
+C_LIKE_QUOTES = {
+    "c": "\"'",
+    "cpp": "\"'",
+    "js": "\"'`"
+}
+
+# Line comment used for the line markers of each language
+LINE_COMMENTS = {
+    "py": "#",
+    "c": "//",
+    "cpp": "//",
+    "js": "//"
+}
+
+# Runs of blank lines at least this long are replaced by a line marker.
+# Shorter runs are kept: a few newlines cost fewer tokens than a marker.
+LINE_MARKER_MIN_GAP = 4
+
+# Token that stands for any docstring when Python token streams are compared
+DOCSTRING_TOKEN = "<docstring>"
+
+# JavaScript keywords after which a '/' starts a regular expression
+JS_REGEX_PRECEDING_KEYWORDS = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete",
+    "void", "throw", "case", "do", "else", "yield", "await"
+}
+
+########################################################################
+
+# @brief Result of a minification pass
+#
+# @details content is the minified source. minified is False when the
+#          source was returned untouched (unsupported language or
+#          failed verification).
+#
+class MinifiedSource:
+    def __init__(self, content: str, minified: bool):
+        self.content = content
+        self.minified = minified
+
+
+# @brief Minifies the given source code
+#
+# @param content Source code to minify
+# @param language Language of the source code (py, js, c or cpp)
+# @return MinifiedSource with the reduced content
+def minify(content: str, language: str) -> MinifiedSource:
+    if language == "py":
+        result = _minify_python(content)
+    elif language in C_LIKE_LANGUAGES:
+        result = _minify_c_like(content, language)
+    else:
+        result = None
+
+    if result is None:
+        return MinifiedSource(content, False)
+
+    return result
+
+
+# @brief Replaces the long runs of blank lines by line markers
+#
+# @details A run of at least LINE_MARKER_MIN_GAP blank lines becomes a
+#          single '<comment> line N' line, N being the original number
+#          of the line that follows. Shorter runs are kept, so the number
+#          of every line is the one of the last marker plus its distance
+#          to it. Trailing blank lines are dropped.
+#
+#          Lines listed in keep are preserved even when blank (they
+#          belong to a multi-line string literal). A blank line that
+#          follows a backslash continuation is preserved as well,
+#          otherwise it would join two logical lines.
+#
+# @param lines Lines of the source (without line terminators)
+# @param keep Set of 1-based line numbers that must not be dropped
+# @param line_comment Line comment of the language (e.g. "#")
+# @return The compacted source
+def _compact_blank_lines(lines: list[str], keep: set[int], line_comment: str) -> str:
+    output = []
+    blank_run = 0
+
+    for number, line in enumerate(lines, start=1):
+        continues = len(output) > 0 and output[-1].endswith("\\")
+        if line.strip() == "" and number not in keep and not continues:
+            blank_run += 1
+            continue
+
+        if blank_run >= LINE_MARKER_MIN_GAP:
+            output.append(f"{line_comment} line {number}")
+        else:
+            output.extend([""] * blank_run)
+
+        blank_run = 0
+        output.append(line)
+
+    content = "\n".join(output)
+    if len(output) > 0:
+        content += "\n"
+
+    return content
+
+
+###############################
+# Python                      #
+###############################
+
+# @brief Minifies Python source code
+#
+# @details Comments are removed using the tokenizer and docstrings are
+#          truncated to their first line using the AST. The token stream
+#          of the result must be the same as the one of the original
+#          (apart from comments, blank lines and docstrings), otherwise
+#          None is returned.
+#
+# @param content Python source code
+# @return MinifiedSource or None if the source could not be minified
+def _minify_python(content: str) -> MinifiedSource:
+    try:
+        tree = ast.parse(content)
+        tokens = list(tokenize.generate_tokens(io.StringIO(content).readline))
+        original_tokens = _python_tokens(content)
+    except (SyntaxError, tokenize.TokenError, ValueError):
+        return None
+
+    # Token rows only end at line terminators, while str.splitlines also
+    # splits on form feeds and other separators
+    lines = _python_lines(content)
+    keep = set()
+
+    # Strip comments from the end of the lines. Lines inside multi-line
+    # strings must be kept as they are, even if they are blank.
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            row, col = token.start
+            lines[row - 1] = lines[row - 1][:col].rstrip()
+        elif token.type == tokenize.STRING and token.start[0] != token.end[0]:
+            keep.update(range(token.start[0] + 1, token.end[0] + 1))
+
+    for node in ast.walk(tree):
+        docstring = _python_docstring_node(node)
+        if docstring is not None:
+            _truncate_python_docstring(lines, docstring, keep)
+
+    minified = _compact_blank_lines(lines, keep, LINE_COMMENTS["py"])
+
+    try:
+        if _python_tokens(minified) != original_tokens:
+            return None
+    except (SyntaxError, tokenize.TokenError, ValueError):
+        return None
+
+    return MinifiedSource(minified, True)
+
+
+# @brief Splits Python source code into lines the way the tokenizer does
+#
+# @param content Python source code
+# @return Lines of the source (without line terminators)
+def _python_lines(content: str) -> list[str]:
+    return [line.rstrip("\r\n") for line in io.StringIO(content).readlines()]
+
+
+# @brief Splits Python source code into the tokens that matter to the code
+#
+# @details Comments and blank lines are left out, and every docstring is
+#          replaced by DOCSTRING_TOKEN since minification truncates them.
+#          Tokens are compared by type and text only, not position.
+#
+# @param content Python source code
+# @return List of tokens (type, text)
+#
+# @throws SyntaxError, tokenize.TokenError if the source does not parse
+def _python_tokens(content: str) -> list[tuple[int, str]]:
+    lines = _python_lines(content)
+
+    # AST column offsets are in UTF-8 bytes, token columns in characters
+    docstrings = set()
+    for node in ast.walk(ast.parse(content)):
+        docstring = _python_docstring_node(node)
+        if docstring is not None:
+            prefix = lines[docstring.lineno - 1].encode("utf-8")[:docstring.col_offset]
+            docstrings.add((docstring.lineno, len(prefix.decode("utf-8"))))
+
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(content).readline):
+        if token.type in (tokenize.COMMENT, tokenize.NL):
+            continue
+
+        if token.type == tokenize.STRING and token.start in docstrings:
+            tokens.append((token.type, DOCSTRING_TOKEN))
+        elif token.type == tokenize.NEWLINE:
+            tokens.append((token.type, ""))
+        else:
+            tokens.append((token.type, token.string))
+
+    return tokens
+
+
+# @brief Returns the docstring expression of the given node, if any
+def _python_docstring_node(node: ast.AST) -> ast.Expr:
+    if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+    if len(node.body) == 0:
+        return None
+
+    first = node.body[0]
+    if (
+            isinstance(first, ast.Expr)
+            and isinstance(first.value, ast.Constant)
+            and isinstance(first.value.value, str)
+    ):
+        return first
+
+    return None
+
+
+# @brief Replaces a docstring with its first non-empty line
+#
+# @details The docstring is only rewritten when it stands alone on its
+#          lines, so no code sharing those lines can be lost. The
+#          freed lines are left blank and compacted afterwards.
+#
+# @param lines Lines of the source, modified in place
+# @param node Docstring expression
+# @param keep Set of line numbers to preserve, updated in place
+def _truncate_python_docstring(lines: list[str], node: ast.Expr, keep: set[int]) -> None:
+    start, end = node.lineno, node.end_lineno
+    first_line = lines[start - 1].encode("utf-8")
+    last_line = lines[end - 1].encode("utf-8")
+
+    if first_line[:node.col_offset].strip() != b"":
+        return
+    if last_line[node.end_col_offset:].strip() != b"":
+        return
+
+    summary = ""
+    for line in node.value.value.strip().splitlines():
+        if line.strip() != "":
+            summary = line.strip()
+            break
+
+    indent = first_line[:node.col_offset].decode("utf-8")
+    lines[start - 1] = indent + repr(summary)
+    for number in range(start + 1, end + 1):
+        lines[number - 1] = ""
+        keep.discard(number)
+
+
+###############################
+# C, C++ and JavaScript       #
+###############################
+
+# @brief Minifies C, C++ or JavaScript source code
+#
+# @details Line and block comments are removed with a small scanner
+#          that skips over string literals. The token stream of the
+#          result is then compared with the one of the original, using
+#          a separate regex-based lexer, to make sure nothing but
+#          comments and whitespace was removed.
+#
+#          Constructs the scanner (and the lexer) cannot tell apart from
+#          comments are refused up front: JavaScript regular expression
+#          literals (e.g. /[/*]/) and '//' comments continued on the
+#          next line by a trailing backslash.
+#
+# @param content Source code
+# @param language One of C_LIKE_LANGUAGES
+# @return MinifiedSource or None if the source could not be minified
+def _minify_c_like(content: str, language: str) -> MinifiedSource:
+    quotes = C_LIKE_QUOTES[language]
+
+    original_tokens = _c_like_tokens(content, quotes)
+    if language == "js" and _has_js_regex_literal(original_tokens):
+        return None
+
+    stripped, keep = _strip_c_like_comments(content, quotes)
+    if stripped is None:
+        return None
+
+    lines = [line.rstrip() for line in stripped.splitlines()]
+    minified = _compact_blank_lines(lines, keep, LINE_COMMENTS[language])
+
+    if _c_like_tokens(minified, quotes) != original_tokens:
+        return None
+
+    return MinifiedSource(minified, True)
+
+
+# @brief Removes the comments from C-like source code
+#
+# @details Block comments are replaced by a space (or by the newlines
+#          they contained) so that tokens never get glued together and
+#          the line numbering is preserved.
+#
+# @param content Source code
+# @param quotes Characters that open a string literal
+# @return Tuple (stripped_content, lines_inside_strings) or (None, None)
+#         if a comment or string literal is not terminated, or a line
+#         comment is continued by a trailing backslash
+def _strip_c_like_comments(content: str, quotes: str) -> tuple[str, set[int]]:
+    output = []
+    keep = set()
+    line = 1
+    i = 0
+    length = len(content)
+
+    while i < length:
+        char = content[i]
+        pair = content[i:i + 2]
+
+        if pair == "//":
+            end = content.find("\n", i)
+            if end == -1:
+                end = length
+            if content[i:end].rstrip().endswith("\\"):
+                return None, None
+
+            i = end
+        elif pair == "/*":
+            end = content.find("*/", i + 2)
+            if end == -1:
+                return None, None
+
+            newlines = content.count("\n", i, end)
+            output.append("\n" * newlines if newlines > 0 else " ")
+            line += newlines
+            i = end + 2
+        elif char in quotes:
+            end = _find_string_end(content, i, char)
+            if end == -1:
+                return None, None
+
+            literal = content[i:end]
+            newlines = literal.count("\n")
+            keep.update(range(line + 1, line + newlines + 1))
+            output.append(literal)
+            line += newlines
+            i = end
+        else:
+            if char == "\n":
+                line += 1
+            output.append(char)
+            i += 1
+
+    return "".join(output), keep
+
+
+# @brief Returns the index right after the string literal starting at start
+#
+# @param content Source code
+# @param start Index of the opening quote
+# @param quote The opening quote character
+# @return Index after the closing quote or -1 if the literal is not closed
+def _find_string_end(content: str, start: int, quote: str) -> int:
+    i = start + 1
+    while i < len(content):
+        char = content[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if char == "\n" and quote != "`" and content[i - 1] != "\\":
+            return -1
+        i += 1
+
+    return -1
+
+
+# @brief Splits C-like source code into tokens
+#
+# @details This lexer is deliberately independent from
+#          _strip_c_like_comments (a single regular expression instead
+#          of a character scanner), so that comparing the tokens of the
+#          original and the minified source catches scanner mistakes.
+#          Comments and whitespace are not part of the token stream.
+#
+# @param content Source code
+# @param quotes Characters that open a string literal
+# @return List of tokens
+def _c_like_tokens(content: str, quotes: str) -> list[str]:
+    patterns = [
+        r'/\*[\s\S]*?\*/',
+        r'//(?:\\\n|[^\n])*'
+    ]
+    for quote in quotes:
+        escaped = re.escape(quote)
+        newline = "" if quote == "`" else "\\n"
+        patterns.append(f'{escaped}(?:\\\\[\\s\\S]|[^{escaped}\\\\{newline}])*{escaped}')
+    patterns += [r'\w+', r'\s+', r'[\s\S]']
+
+    tokens = []
+    for match in re.finditer("|".join(patterns), content):
+        token = match.group(0)
+        if token.startswith(("//", "/*")) or token.isspace():
+            continue
+        tokens.append(token)
+
+    return tokens
+
+
+# @brief Checks if JavaScript tokens contain a regular expression literal
+#
+# @details A '/' that does not follow an operand (identifier, number,
+#          literal, ')' or ']') starts a regular expression. Its body
+#          may contain '//', '/*' or quotes, which the scanner would
+#          take for a comment or a string.
+#
+# @param tokens Tokens returned by _c_like_tokens
+# @return True if a regular expression literal may be present
+def _has_js_regex_literal(tokens: list[str]) -> bool:
+    for index, token in enumerate(tokens):
+        if token != "/":
+            continue
+        if index == 0:
+            return True
+
+        previous = tokens[index - 1]
+        if previous in JS_REGEX_PRECEDING_KEYWORDS:
+            return True
+        if not (re.match(r'\w', previous) or previous[0] in "\"'`)]"):
+            return True
+
+    return False
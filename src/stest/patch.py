@@ -0,0 +1,154 @@
+########################################################################
+# @file patch.py                                                       #
+# @brief Stest Unified Diff Module                                     #
+#                                                                      #
+# This module builds the unified diffs of the source files that are    #
+# sent to the model in patch mode, and applies the unified diffs that  #
+# the model returns for the test files.                                #
+#                                                                      #
+# The model is not reliable with hunk line numbers, so hunks are       #
+# located by their context lines; the line numbers are only used as    #
+# a hint of where to start looking.                                    #
+#                                                                      #
+########################################################################
+
+import difflib
+import re
+
+########################################################################
+
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+########################################################################
+
+# @brief Builds the unified diff between two versions of a file
+#
+# @param old_content Previous content of the file
+# @param new_content Current content of the file
+# @param filename Name of the file, used in the diff headers
+# @return Unified diff (empty if the contents are the same)
+def build_unified_diff(old_content: str, new_content: str, filename: str) -> str:
+    diff = difflib.unified_diff(
+        old_content.splitlines(keepends=True),
+        new_content.splitlines(keepends=True),
+        fromfile="a/" + filename,
+        tofile="b/" + filename
+    )
+
+    lines = []
+    for line in diff:
+        if not line.endswith("\n"):
+            line += "\n\\ No newline at end of file\n"
+        lines.append(line)
+
+    return "".join(lines)
+
+
+# @brief Applies a unified diff to the given content
+#
+# @param content Content to patch
+# @param diff Unified diff to apply
+# @return Patched content
+#
+# @throws ValueError if a hunk does not match the content
+def apply_unified_diff(content: str, diff: str) -> str:
+    lines = content.splitlines()
+    hunks = _parse_hunks(diff)
+
+    output = []
+    position = 0
+    for hunk in hunks:
+        start = _find_hunk(lines, hunk, position)
+        if start == -1:
+            raise ValueError(f"Hunk starting at line {hunk['old_start']} does not apply")
+
+        output.extend(lines[position:start])
+        output.extend(hunk["new_lines"])
+        position = start + len(hunk["old_lines"])
+
+    output.extend(lines[position:])
+
+    # The last hunk may end the file without a newline
+    ends_without_newline = len(hunks) > 0 and position == len(lines) and hunks[-1]["no_newline"]
+
+    patched = "\n".join(output)
+    if (content.endswith("\n") or len(hunks) > 0) and not ends_without_newline:
+        patched += "\n"
+
+    return patched
+
+
+# @brief Parses the hunks of a unified diff
+#
+# @param diff Unified diff
+# @return List of hunks ({"old_start", "old_lines", "new_lines", "no_newline"}),
+#         no_newline being set when the new version of the file does not
+#         end with a newline after the hunk
+#
+# @throws ValueError if the diff is malformed
+def _parse_hunks(diff: str) -> list[dict]:
+    hunks = []
+    hunk = None
+    previous = None
+
+    # Trailing blank lines are not part of the last hunk
+    for line in diff.rstrip().splitlines():
+        match = HUNK_HEADER_PATTERN.match(line)
+        if match:
+            hunk = {
+                "old_start": int(match.group(1)),
+                "old_lines": [],
+                "new_lines": [],
+                "no_newline": False
+            }
+            hunks.append(hunk)
+        elif hunk is None:
+            # File headers come before the first hunk
+            continue
+        elif line.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it
+            if previous is not None and not previous.startswith("-"):
+                hunk["no_newline"] = True
+        elif line.startswith("-"):
+            hunk["old_lines"].append(line[1:])
+        elif line.startswith("+"):
+            hunk["new_lines"].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            hunk["old_lines"].append(line[1:])
+            hunk["new_lines"].append(line[1:])
+        else:
+            raise ValueError(f"Malformed diff line: {line}")
+
+        previous = line
+
+    if len(hunks) == 0 and diff.strip() != "":
+        raise ValueError("The diff does not contain any hunk")
+
+    return hunks
+
+
+# @brief Finds where a hunk applies in the given lines
+#
+# @details Looks for the hunk's old lines at or after position, starting
+#          at the line given in the hunk header and moving outwards.
+#          Trailing whitespace is ignored when comparing lines.
+#
+# @param lines Lines of the content
+# @param hunk Hunk to apply
+# @param position First line the hunk may start at
+# @return Index of the first line of the hunk or -1 if it does not apply
+def _find_hunk(lines: list[str], hunk: dict, position: int) -> int:
+    old_lines = [line.rstrip() for line in hunk["old_lines"]]
+    last_start = len(lines) - len(old_lines)
+    hint = min(max(hunk["old_start"] - 1, position), max(last_start, position))
+
+    for offset in range(0, len(lines) + 1):
+        for start in (hint - offset, hint + offset):
+            if start < position or start > last_start:
+                continue
+
+            window = lines[start:start + len(old_lines)]
+            if [line.rstrip() for line in window] == old_lines:
+                return start
+
+    return -1
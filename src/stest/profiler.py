@@ -0,0 +1,106 @@
+########################################################################
+# @file profiler.py                                                    #
+# @brief Stest Profiling Module                                        #
+#                                                                      #
+# This module times the phases of a stest command (environment         #
+# discovery, config load/save, directory walks, hashing, payload       #
+# building, model calls, output writing...) when stest is run with     #
+# '--profile'.                                                         #
+#                                                                      #
+# Phases can be nested: a phase started while another one is running  #
+# is reported under it. When profiling is disabled, phases cost a      #
+# single check.                                                        #
+#                                                                      #
+########################################################################
+
+import functools
+import time
+from contextlib import contextmanager
+
+########################################################################
+
+_enabled = False
+
+# Names of the phases currently running, outermost first
+_stack = []
+
+# Timings of each phase, keyed by its path in the phase tree
+# ({(outer, ..., name): [total_seconds, calls]}), in start order
+_timings = {}
+
+########################################################################
+
+# @brief Enables profiling
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+# @brief Checks if profiling is enabled
+# @return True if profiling is enabled, False otherwise
+def is_enabled() -> bool:
+    return _enabled
+
+
+# @brief Times the enclosed block as the given phase
+#
+# @details Usage:
+#              with profiler.phase("payload building"):
+#                  ...
+#
+# @param name Name of the phase
+@contextmanager
+def phase(name: str):
+    if not _enabled:
+        yield
+        return
+
+    _stack.append(name)
+    timing = _timings.setdefault(tuple(_stack), [0.0, 0])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing[0] += time.perf_counter() - start
+        timing[1] += 1
+        _stack.pop()
+
+
+# @brief Decorator that times every call of a function as the given phase
+# @param name Name of the phase
+def timed(name: str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# @brief Returns the phase breakdown as a printable string
+#
+# @details Each phase shows its total time, its share of the total time
+#          of all the top-level phases and its number of calls. Nested
+#          phases are indented under the phase they ran in.
+#
+# @return The phase breakdown
+def report() -> str:
+    total = sum(timing[0] for path, timing in _timings.items() if len(path) == 1)
+
+    # Nested phases follow their parent, siblings keep the order in
+    # which they were first started
+    order = {path: index for index, path in enumerate(_timings)}
+    sort_key = lambda path: [order[path[:depth]] for depth in range(1, len(path) + 1)]
+
+    lines = ["Profile (wall time):"]
+    for path in sorted(_timings, key=sort_key):
+        seconds, calls = _timings[path]
+        share = seconds / total * 100 if total > 0 else 0.0
+        name = "  " * len(path) + path[-1]
+        lines.append(f"{name:<40} {seconds:>9.3f}s {share:>6.1f}% {calls:>6} call(s)")
+
+    return "\n".join(lines)
+
@@ -63,6 +63,36 @@ CREATE_TESTS_REFACTOR_PROMPT = """
 
 """
 
+# Used instead of the above when only a small part of the source files changed.
+# Rather than re-emitting whole test files (output tokens are the slowest part of a
+# completion), the model is given the diff of each source file since the last test
+# generation and asked for a unified diff against the previous test file, which
+# stest then applies locally (check patch.py).
+CREATE_TESTS_PATCH_PROMPT = """
+    You are an experienced software developer who has been hired to
+    maintain unit tests. The code is written in {language}
+    and the tests are written using {test_framework}.
+
+    I will now give you a set of unified diffs, one for each source file that changed
+    since the tests were last written. The diffs will be separated by the delimiter
+    '= FILE STARTS HERE ='; the line that follows the delimiter will be the name of the file.
+
+    You will also be provided with the current version of the tests for each of those files.
+    The tests will be separated by the delimiter '= PREVIOUS TEST FILE STARTS HERE =';
+    the line that follows the delimiter will be the name of the test file.
+
+    When I am finished, I will tell you 'ALL FILES SENT'.
+    DO NOT answer until you have received all the files.
+
+    In the end, you will return a unified diff for each test file that updates the tests
+    so that they cover the changes, using the delimiter '= FILE STARTS HERE ='. The line
+    that follows the delimiter must be the name of the test file.
+    Change the tests as little as possible and keep at least 3 lines of context in each hunk.
+
+    You MUST ONLY return the diffs. NOTHING ELSE.
+    The diffs MUST NOT INCLUDE MARKDOWN SYNTAX.
+"""
+
 # This prompt is used to check if the given file is written 
 # in the given language.
 #
@@ -92,4 +122,12 @@ ALL_PARTS_SENT_PROMPT = "ALL PARTS SENT"
 # This prompt informs CHAT-GPT that all the files have been fully sent.
 ALL_FILES_SENT_PROMPT = "ALL FILES SENT"
 
+# This prompt asks CHAT-GPT to continue a response that was cut off
+# because it reached the maximum number of tokens.
+# The parts are concatenated, so nothing may be repeated or added.
+CONTINUE_RESPONSE_PROMPT = """
+    Your answer was cut off. Continue it EXACTLY where it stopped, starting
+    with the next character. DO NOT repeat anything and DO NOT add anything else.
+"""
+
 
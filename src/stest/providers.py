@@ -0,0 +1,264 @@
+########################################################################
+# @file providers.py                                                   #
+# @brief Stest Model Providers Module                                  #
+#                                                                      #
+# This module decides which model provider handles each task and      #
+# builds the API clients for them. Any OpenAI-compatible endpoint can  #
+# be used (e.g. a local server), so cheap high-volume tasks such as    #
+# the language check can be routed to a fast local model while test    #
+# generation stays on the big one.                                     #
+#                                                                      #
+# All the clients share a single keep-alive HTTP connection pool.      #
+#                                                                      #
+# Providers are configured in .stest/config.json:                      #
+#                                                                      #
+#   "providers": {                                                     #
+#       "local": {                                                     #
+#           "base_url": "http://localhost:8080/v1",                    #
+#           "model": "llama3"                                          #
+#       }                                                              #
+#   },                                                                 #
+#   "routing": {                                                       #
+#       "language_check": "local"                                      #
+#   }                                                                  #
+#                                                                      #
+# or in the environment (STEST_<NAME>_BASE_URL, STEST_<NAME>_MODEL,   #
+# ... for a provider, STEST_<TASK>_PROVIDER for the routing). The      #
+# "default" provider uses STEST_BASE_URL, STEST_MODEL...               #
+#                                                                      #
+# Only the STEST_* variables of the project .env file are read, it is  #
+# never loaded into the environment. The key shipped with stest is     #
+# only sent to the endpoint shipped with it.                           #
+#                                                                      #
+########################################################################
+
+import os
+
+import httpx
+from dotenv import dotenv_values, find_dotenv
+from openai import OpenAI
+
+########################################################################
+
+DEFAULT_PROVIDER = "default"
+
+# Prefix of all the environment variables read by stest
+ENV_PREFIX = "STEST_"
+
+# Where a setting comes from, from the lowest to the highest precedence
+SOURCE_PACKAGE = "stest .env file"
+SOURCE_PROJECT = "project .env file"
+SOURCE_ENVIRONMENT = "environment"
+SOURCE_CONFIG = "config file"
+
+# Tasks that can be routed to a provider
+TASK_CREATE_TESTS = "create_tests"
+TASK_LANGUAGE_CHECK = "language_check"
+
+# Settings of a provider and their types (check openai_iface.py/IOpenAI)
+PROVIDER_SETTINGS = {
+    "base_url": str,
+    "api_key": str,
+    "model": str,
+    "max_tokens": int,
+    "model_token_limit": int,
+    "timeout": float
+}
+
+# API key sent to custom endpoints that were not given one,
+# local OpenAI-compatible servers usually ignore it
+PLACEHOLDER_API_KEY = "none"
+
+# Shared HTTP connection pool. Completions can take minutes, so the read
+# timeout is long, but connecting should be quick (especially locally).
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY = 60.0
+HTTP_CONNECT_TIMEOUT = 10.0
+HTTP_READ_TIMEOUT = 600.0
+
+########################################################################
+
+# STEST_* variables and where they come from ({name: (value, source)}),
+# None until the .env files have been read
+_environment = None
+_http_client = None
+_clients = {}
+
+########################################################################
+
+# @brief Returns the settings of the provider for the given task
+#
+# @details The provider is taken from config["routing"][task], then from
+#          the STEST_<TASK>_PROVIDER variable, and defaults to
+#          DEFAULT_PROVIDER.
+#
+# @param task Task to route (e.g. TASK_LANGUAGE_CHECK)
+# @param config The stest config
+# @return Settings of the provider (check get_provider_settings)
+def get_task_provider(task: str, config: dict) -> dict:
+    name = config.get("routing", {}).get(task)
+    if name is None:
+        name, _ = _get_variable(task.upper() + "_PROVIDER")
+    if name is None:
+        name = DEFAULT_PROVIDER
+
+    return get_provider_settings(name, config)
+
+
+# @brief Returns the settings of the given provider
+#
+# @details Settings come from the STEST_<NAME>_<SETTING> variables (just
+#          STEST_<SETTING> for the default provider) and are overridden
+#          by config["providers"][name]. The API key can also be given as
+#          the name of an environment variable ("api_key_env"), so that
+#          it does not have to be stored in the config file.
+#
+#          An API key is never sent to an endpoint that was set somewhere
+#          else than the key itself: the key shipped with stest (or the
+#          OpenAI one IOpenAI defaults to) is replaced by a placeholder
+#          when the base URL comes from the project or the config.
+#
+#          Only the settings that were set are returned, IOpenAI uses
+#          its defaults for the others.
+#
+# @param name Name of the provider
+# @param config The stest config
+# @return Dict of settings that can be passed to IOpenAI
+#
+# @throws Exception if the provider or one of its settings is unknown or invalid
+def get_provider_settings(name: str, config: dict) -> dict:
+    prefix = "" if name == DEFAULT_PROVIDER else name.upper() + "_"
+    settings = {}
+    sources = {}
+    for key in PROVIDER_SETTINGS:
+        variable = ENV_PREFIX + prefix + key.upper()
+        value, source = _get_variable(prefix + key.upper())
+        if value is not None:
+            settings[key] = _cast_setting(key, value, variable)
+            sources[key] = source
+
+    configured = config.get("providers", {}).get(name)
+    if configured is None and name != DEFAULT_PROVIDER and len(settings) == 0:
+        raise Exception(f"Unknown provider '{name}'. Define it in the 'providers' section of the config file.")
+
+    for key, value in (configured or {}).items():
+        if key == "api_key_env":
+            settings["api_key"] = os.getenv(value)
+            sources["api_key"] = SOURCE_CONFIG
+            if settings["api_key"] is None:
+                raise Exception(f"Environment variable '{value}' (providers.{name}.api_key_env) is not set.")
+        elif key in PROVIDER_SETTINGS:
+            settings[key] = _cast_setting(key, value, f"providers.{name}.{key}")
+            sources[key] = SOURCE_CONFIG
+        else:
+            raise Exception(f"Unknown setting '{key}' for provider '{name}'.")
+
+    # Never send the OpenAI key to another endpoint
+    if settings.get("base_url"):
+        if not settings.get("api_key") or (
+                sources["api_key"] == SOURCE_PACKAGE and sources["base_url"] != SOURCE_PACKAGE
+        ):
+            settings["api_key"] = PLACEHOLDER_API_KEY
+
+    return settings
+
+
+# @brief Returns the API client for the given endpoint
+#
+# @details Clients are cached, and all of them use the shared HTTP
+#          connection pool, so connections are kept alive across
+#          requests and tasks.
+#
+# @param base_url Base URL of the OpenAI-compatible API (None for OpenAI)
+# @param api_key API key
+# @param timeout Timeout of the requests in seconds (None for the pool default)
+# @return OpenAI client
+def get_client(base_url: str, api_key: str, timeout: float = None) -> OpenAI:
+    key = (base_url, api_key, timeout)
+    if key not in _clients:
+        options = {
+            "api_key": api_key,
+            "base_url": base_url,
+            "http_client": _get_http_client()
+        }
+        if timeout is not None:
+            options["timeout"] = timeout
+
+        _clients[key] = OpenAI(**options)
+
+    return _clients[key]
+
+
+# @brief Returns the shared HTTP client
+def _get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        )
+
+    return _http_client
+
+
+# @brief Converts a setting to its type
+#
+# @param key Name of the setting (check PROVIDER_SETTINGS)
+# @param value Value of the setting
+# @param origin Where the value was read from, for the error message
+# @return The converted value
+#
+# @throws Exception if the value cannot be converted
+def _cast_setting(key: str, value, origin: str):
+    try:
+        return PROVIDER_SETTINGS[key](value)
+    except (TypeError, ValueError):
+        raise Exception(f"Invalid value '{value}' for {origin}, expected {PROVIDER_SETTINGS[key].__name__}.")
+
+
+# @brief Returns a STEST_* variable and where it comes from
+#
+# @param name Name of the variable, without ENV_PREFIX
+# @return Tuple (value, source) or (None, None) if the variable is not set
+def _get_variable(name: str) -> tuple[str, str]:
+    return _load_environment().get(ENV_PREFIX + name, (None, None))
+
+
+# @brief Reads the STEST_* variables (once)
+#
+# @details The environment takes precedence over the .env file of the
+#          current project (searched from the current directory upwards),
+#          which takes precedence over the one shipped with stest. The
+#          .env files are not loaded into the environment, and only the
+#          STEST_* variables of the project one are read, so unrelated
+#          variables of the project (e.g. its own BASE_URL) are ignored.
+#
+# @return Dict {name: (value, source)}
+def _load_environment() -> dict[str, tuple[str, str]]:
+    global _environment
+    if _environment is not None:
+        return _environment
+
+    layers = [(
+        SOURCE_PACKAGE,
+        dotenv_values(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+    )]
+
+    project_env_file = find_dotenv(usecwd=True)
+    if project_env_file:
+        layers.append((SOURCE_PROJECT, dotenv_values(project_env_file)))
+
+    layers.append((SOURCE_ENVIRONMENT, os.environ))
+
+    _environment = {}
+    for source, variables in layers:
+        for name, value in variables.items():
+            if name.startswith(ENV_PREFIX) and value is not None:
+                _environment[name] = (value, source)
+
+    return _environment
@@ -0,0 +1,71 @@
+########################################################################
+# @file shard.py                                                       #
+# @brief Stest Sharding Module                                         #
+#                                                                      #
+# This module splits the files that need tests across several CI       #
+# nodes ('create-tests --shard i/N'). The assignment must be the same  #
+# on every node without any coordination, so it only depends on the   #
+# file paths (relative to the stest environment) and, for the          #
+# "weight" strategy, on the file contents.                             #
+#                                                                      #
+########################################################################
+
+import hashlib
+
+########################################################################
+
+# @brief Parses a shard specification
+#
+# @param spec Shard specification in the form "i/N" (1 <= i <= N)
+# @return Tuple (i, N)
+#
+# @throws Exception if the specification is not valid
+def parse_shard_spec(spec: str) -> tuple[int, int]:
+    parts = spec.split("/")
+    if len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit():
+        raise Exception(f"Invalid shard '{spec}', expected 'i/N' (e.g. 1/4).")
+
+    index, count = int(parts[0]), int(parts[1])
+    if count < 1 or index < 1 or index > count:
+        raise Exception(f"Invalid shard '{spec}', i must be between 1 and N.")
+
+    return index, count
+
+
+# @brief Assigns each key to a shard using a hash of the key
+#
+# @details Keys never move between shards as long as N does not change,
+#          regardless of the other keys.
+#
+# @param keys Keys to assign (relative file paths)
+# @param count Number of shards
+# @return Dict {key: shard} with shards numbered from 1 to count
+def assign_by_hash(keys: list[str], count: int) -> dict[str, int]:
+    shards = {}
+    for key in keys:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        shards[key] = int(digest, 16) % count + 1
+
+    return shards
+
+
+# @brief Assigns each key to a shard balancing the total weight
+#
+# @details Greedy longest-processing-time assignment: the heaviest keys
+#          go first, each to the currently lightest shard. Ties are
+#          broken by key and by shard number so the result is the same
+#          on every node.
+#
+# @param weights Dict {key: weight} (e.g. number of tokens of the file)
+# @param count Number of shards
+# @return Dict {key: shard} with shards numbered from 1 to count
+def assign_by_weight(weights: dict[str, int], count: int) -> dict[str, int]:
+    loads = [0] * count
+    shards = {}
+
+    for key in sorted(weights, key=lambda key: (-weights[key], key)):
+        lightest = loads.index(min(loads))
+        loads[lightest] += weights[key]
+        shards[key] = lightest + 1
+
+    return shards
@@ -27,6 +27,12 @@ from colorama import Fore, Style
 from . import utils
 from .openai_iface import IOpenAI
 from . import prompts
+from . import minify
+from . import patch
+from .journal import Journal
+from . import shard
+from . import profiler
+from . import providers
 
 ########################################################################
 
@@ -44,12 +50,17 @@ DEFAULT_CONFIG = {
     "tracked_files": {},
     "language": "",
     "test_framework": "",
-    "test_dir": ""
+    "test_dir": "",
+    "providers": {},
+    "routing": {}
 }
 
 # Dir name for stest environments
 STEST_DIR = ".stest"
 STEST_CONFIG_FILE = "config.json"
+SNAPSHOTS_DIR = "snapshots"
+JOURNAL_DIR = "journal"
+SHARDS_DIR = "shards"
 
 DIR_SEPARATOR = "\\"
 if utils.is_posix():
@@ -58,6 +69,11 @@ if utils.is_posix():
 FILE_START_DELIMITER = "= FILE STARTS HERE ="
 PREV_TEST_FILE_START_DELIMITER = "= PREVIOUS TEST FILE STARTS HERE ="
 
+# Number of files whose tests are generated (or patched) by a single
+# request. Each response is journaled as soon as it arrives, so smaller
+# requests lose less work when a run is interrupted (check journal.py).
+FILES_PER_REQUEST = 4
+
 # This is the maximum depth of parent directories that will be searched
 # for a stest environment. This is so that the user can run stest from
 # a subdirectory of the stest environment, just like in git.
@@ -68,7 +84,8 @@ MAX_PARENT_SEARCH_DEPTH = 5
 class Stest:
     def __init__(self):
         self.config = None
-        self.openai_iface = IOpenAI()
+        self.journal = None
+        self.openai_ifaces = {}
 
         self.stest_environment_root = self.__fetch_stest_environment_root()
 
@@ -144,11 +161,30 @@ class Stest:
     #
     # This is a mess, I know. We are in a Geekathon, no time for
     # refactoring.
-    def create_tests(self) -> None:
+    #
+    # @param minify_sources Strip comments and docstrings from the files before sending them
+    # @param patch_mode Ask for patches against the previous test files instead of whole files
+    # @param resume Replay the work finished by an interrupted run instead of sending it again
+    # @param shard_spec Only create the tests of shard "i/N" (check shard.py for details)
+    # @param shard_strategy How files are assigned to the shards ("hash" or "weight")
+    def create_tests(
+            self,
+            minify_sources: bool = False,
+            patch_mode: bool = False,
+            resume: bool = False,
+            shard_spec: str = None,
+            shard_strategy: str = "hash"
+    ) -> None:
         if self.stest_environment_root == None:
             raise Exception("The current directory/workspace is not a stest environment.")
 
         self.__load_config_file(self.stest_environment_root + DIR_SEPARATOR + STEST_CONFIG_FILE)
+        self.journal = Journal(self.stest_environment_root + DIR_SEPARATOR + JOURNAL_DIR)
+
+        if not resume and self.journal.exists():
+            print(f"{Fore.YELLOW}Discarding the progress of an interrupted run. Use 'stest create-tests --resume' to continue it instead.{Style.RESET_ALL}")
+            self.journal.clear()
+
         files_to_test = []
         previous_test_files = []
 
@@ -159,37 +195,207 @@ class Stest:
 
                 files_to_test.append(file)
 
+        if shard_spec is not None:
+            files_to_test = self.__select_shard_files(files_to_test, shard_spec, shard_strategy)
+            previous_test_files = [file for file in previous_test_files if file in files_to_test]
+            print(f"Shard {shard_spec}: {Fore.LIGHTBLACK_EX}{len(files_to_test)}{Style.RESET_ALL} modified file(s) assigned to this node.")
+
         if len(files_to_test) == 0:
             print(f"{Fore.YELLOW}No modifications since last test generation were found, aborting.{Style.RESET_ALL}")
+            if shard_spec is not None:
+                self.__save_shard_file(shard_spec, files_to_test)
+            self.journal.clear()
             return
 
-        print(f"Generating tests for {Fore.LIGHTBLACK_EX}{len(files_to_test)}{Style.RESET_ALL} files. This may take a while.")
-        
-        data_to_send = ""
+        # Files whose tests are not written (e.g. the response was cut off)
+        # get their previous hash back, so they are retried on the next run
+        previous_hashes = {}
         for file in files_to_test:
+            previous_hashes[file] = self.config["tracked_files"][file]["hash"]
             self.config["tracked_files"][file]["hash"] = utils.get_file_hash(file)
-            data_to_send += self.__build_serialized_file_data(file)
-
-        for file in previous_test_files:
-            data_to_send += self.__build_serialized_previous_test_file_data(file)
 
-        prompt_to_use = None
-        if len(previous_test_files) > 0:
-            print(f"{Fore.YELLOW}Previous test files were found for {len(previous_test_files)} file(s). Stest will refactor them.{Style.RESET_ALL}")
-            prompt_to_use = prompts.CREATE_TESTS_REFACTOR_PROMPT
+        files_to_generate = files_to_test
+        unfinished_files = []
+        if resume:
+            replayed_files = self.__replay_journal(files_to_test)
+            print(f"Resuming interrupted run: {Fore.LIGHTBLACK_EX}{len(replayed_files)}{Style.RESET_ALL} file(s) were already done.")
+            files_to_generate = [file for file in files_to_test if file not in replayed_files]
+            previous_test_files = [file for file in previous_test_files if file not in replayed_files]
+
+        if len(files_to_generate) > 0:
+            print(f"Generating tests for {Fore.LIGHTBLACK_EX}{len(files_to_generate)}{Style.RESET_ALL} files. This may take a while.")
+
+        if patch_mode:
+            patchable_files = [file for file in previous_test_files if self.__file_has_snapshot(file)]
+            if len(patchable_files) > 0:
+                print(f"{Fore.YELLOW}Previous test files and snapshots were found for {len(patchable_files)} file(s). Stest will patch them.{Style.RESET_ALL}")
+                patched_files = []
+                for start in range(0, len(patchable_files), FILES_PER_REQUEST):
+                    patched_files += self.__patch_tests(patchable_files[start:start + FILES_PER_REQUEST])
+
+                files_to_generate = [file for file in files_to_generate if file not in patched_files]
+                previous_test_files = [file for file in previous_test_files if file not in patched_files]
+
+        if len(files_to_generate) > 0:
+            if len(previous_test_files) > 0:
+                print(f"{Fore.YELLOW}Previous test files were found for {len(previous_test_files)} file(s). Stest will refactor them.{Style.RESET_ALL}")
+
+            # Requests interrupted in the middle of their response are
+            # continued first, the other files are split into new requests
+            requests = []
+            if resume:
+                requests = self.__get_partial_requests(files_to_generate)
+
+            requested_files = [file for request in requests for file in request["files"]]
+            remaining_files = [file for file in files_to_generate if file not in requested_files]
+            for start in range(0, len(remaining_files), FILES_PER_REQUEST):
+                requests.append({
+                    "files": remaining_files[start:start + FILES_PER_REQUEST],
+                    "partial_response": None
+                })
+
+            for index, request in enumerate(requests):
+                filenames = ", ".join(utils.get_filename(file) for file in request["files"])
+                print(f"  [{index + 1}/{len(requests)}] {Fore.LIGHTBLACK_EX}{filenames}{Style.RESET_ALL}")
+
+                unfinished_files += self.__generate_tests(
+                    request["files"],
+                    [file for file in previous_test_files if file in request["files"]],
+                    minify_sources,
+                    request["partial_response"]
+                )
+
+        for file in unfinished_files:
+            self.config["tracked_files"][file]["hash"] = previous_hashes[file]
+
+        if len(unfinished_files) > 0:
+            print(f"{Fore.YELLOW}No tests were returned for {len(unfinished_files)} file(s). They will be retried on the next run:{Style.RESET_ALL}")
+            for file in unfinished_files:
+                print(f"  {Fore.YELLOW}{utils.absolute_path_to_relative_path(file)}{Style.RESET_ALL}")
+
+        finished_files = [file for file in files_to_test if file not in unfinished_files]
+        for file in finished_files:
+            self.__save_snapshot(file)
+
+        if shard_spec is not None:
+            self.__save_shard_file(shard_spec, finished_files)
         else:
-            prompt_to_use = prompts.CREATE_TESTS_PROMPT
+            self.__save_config_file(self.stest_environment_root + DIR_SEPARATOR + STEST_CONFIG_FILE)
+        self.journal.clear()
+        print(f"{Fore.GREEN}Tests have been written to {utils.absolute_path_to_relative_path(self.config['test_dir'])}.{Style.RESET_ALL}")
 
-        response = self.openai_iface.send_data_in_chunks_and_get_response(
-            prompt_to_use, data_to_send
-        )
+    
+    # @brief Merges the results of sharded create-tests runs
+    #
+    # @details Each 'create-tests --shard i/N' run writes a shard file with
+    #          the updated hashes and the test files it generated, instead of
+    #          updating config.json. This method combines the shard files
+    #          (collected from the CI nodes into .stest/shards/) into the
+    #          config file and writes the test files.
+    #
+    #          Shards never share files, so a file that appears in two shard
+    #          files with different results means the shards come from
+    #          different runs; nothing is merged in that case.
+    #
+    #          Merged shard files are deleted if they are in .stest/shards/,
+    #          shard files given from anywhere else are kept.
+    #
+    # @param paths Paths to the shard files (all shard files in .stest/shards/ if empty)
+    def merge_shards(self, paths: list[str]) -> None:
+        if self.stest_environment_root == None:
+            raise Exception("The current directory/workspace is not a stest environment.")
+
+        self.__load_config_file(self.stest_environment_root + DIR_SEPARATOR + STEST_CONFIG_FILE)
+
+        if len(paths) == 0:
+            shards_dir = self.stest_environment_root + DIR_SEPARATOR + SHARDS_DIR
+            if utils.is_dir(shards_dir):
+                paths = [
+                    shards_dir + DIR_SEPARATOR + filename
+                    for filename in sorted(os.listdir(shards_dir))
+                    if filename.endswith(".json")
+                ]
+
+        if len(paths) == 0:
+            raise Exception("No shard files were found. Copy the shard files of each node into .stest/shards/ first.")
+
+        shard_count = None
+        merged_shards = set()
+        file_hashes = {}
+        file_tests = {}
+        test_files = {}
+
+        for path in paths:
+            with open(path, "r") as f:
+                shard_data = json.load(f)
+
+            if shard_count is None:
+                shard_count = shard_data["shards"]
+            elif shard_data["shards"] != shard_count:
+                raise Exception(f"The shard file {path} is for {shard_data['shards']} shards, expected {shard_count}.")
+
+            merged_shards.add(shard_data["shard"])
+
+            for file, entry in shard_data["tracked_files"].items():
+                if file in file_hashes and file_hashes[file] != entry["hash"]:
+                    raise Exception(f"Conflicting results for {file} in the shard files, nothing was merged.")
+                file_hashes[file] = entry["hash"]
+                if "test_file" in entry:
+                    file_tests[file] = entry["test_file"]
+
+            for test_file, content in shard_data["tests"].items():
+                if test_file in test_files and test_files[test_file] != content:
+                    raise Exception(f"Conflicting tests for {test_file} in the shard files, nothing was merged.")
+                test_files[test_file] = content
+
+        missing_shards = [str(i) for i in range(1, shard_count + 1) if i not in merged_shards]
+        if len(missing_shards) > 0:
+            print(f"{Fore.YELLOW}Missing shard(s) {', '.join(missing_shards)} of {shard_count}. Their files will be generated on the next run.{Style.RESET_ALL}")
+
+        environment_dir = os.path.dirname(self.stest_environment_root)
+
+        # Entries of files that are not tracked here (e.g. a shard file from
+        # another environment) are ignored, along with their tests
+        tracked_files = {}
+        for file in file_hashes:
+            file_path = os.path.abspath(os.path.join(environment_dir, file))
+            if not self.__file_is_tracked(file_path):
+                print(f"{Fore.YELLOW}Ignoring {file}: not tracked in this environment.{Style.RESET_ALL}")
+                continue
+
+            tracked_files[file] = file_path
+
+        written_tests = 0
+        for file in tracked_files:
+            test_file = file_tests.get(file)
+            if test_file is None or test_file not in test_files:
+                continue
+
+            test_file_path = os.path.abspath(os.path.join(environment_dir, test_file))
+            utils.create_dir(os.path.dirname(test_file_path))
+            with open(test_file_path, "w") as f:
+                f.write(test_files[test_file])
+
+            written_tests += 1
+
+        for file, file_path in tracked_files.items():
+            file_hash = file_hashes[file]
+            self.config["tracked_files"][file_path]["hash"] = file_hash
+            if utils.get_file_hash(file_path) == file_hash:
+                self.__save_snapshot(file_path)
 
-        utils.create_dir(self.config["test_dir"])
-        self.__save_serialized_test_data(self.config["test_dir"], response)
         self.__save_config_file(self.stest_environment_root + DIR_SEPARATOR + STEST_CONFIG_FILE)
-        print(f"{Fore.GREEN}Tests have been written to {utils.absolute_path_to_relative_path(self.config['test_dir'])}.{Style.RESET_ALL}")
 
-    
+        # Only the shard files collected in .stest/shards/ are consumed,
+        # files passed from elsewhere (e.g. CI artifacts) are left alone
+        shards_dir = os.path.realpath(self.stest_environment_root + DIR_SEPARATOR + SHARDS_DIR)
+        for path in paths:
+            if os.path.dirname(os.path.realpath(path)) == shards_dir:
+                os.remove(path)
+
+        print(f"{Fore.GREEN}Merged {len(paths)} shard(s): {len(tracked_files)} file(s) and {written_tests} test file(s) updated.{Style.RESET_ALL}")
+
+
     # @brief Displays the current status of the stest environment
     #
     # @details This method displays the current status of the stest environment.
@@ -243,11 +449,89 @@ class Stest:
     # @param file Path to the file
     # @return True if the file exists, False otherwise
     def __file_has_previous_test_file(self, file: str) -> bool:
+        return os.path.exists(self.__get_test_file_path(file))
+
+
+    # @brief Returns the path of the test file for a given file
+    #
+    # @details Chat GPT may name the test file with another case than the
+    #          file (e.g. test_myclass.py for MyClass.py), so if the expected
+    #          test file does not exist, the one with the same normalized
+    #          name is returned (check __normalize_test_filename).
+    #
+    # @param file Path to the file
+    # @return Path to the test file
+    def __get_test_file_path(self, file: str) -> str:
         filename = utils.get_filename(file)
         test_filename = "test_" + filename # TODO: Maybe make this configurable
-
         test_file = self.config["test_dir"] + DIR_SEPARATOR + test_filename
-        return os.path.exists(test_file)
+
+        if not os.path.exists(test_file) and utils.is_dir(self.config["test_dir"]):
+            for existing_filename in os.listdir(self.config["test_dir"]):
+                if self.__normalize_test_filename(existing_filename) == self.__normalize_test_filename(test_filename):
+                    return self.config["test_dir"] + DIR_SEPARATOR + existing_filename
+
+        return test_file
+
+
+    # @brief Normalizes the name of a test file so it can be compared
+    #
+    # @details Chat GPT is asked for all-lowercase names, but does not always
+    #          follow the case (or the whitespace) of the names it was given.
+    #          Names from a response and the expected names of the test files
+    #          are only compared once normalized.
+    #
+    # @param filename Name of the test file
+    # @return Normalized name
+    def __normalize_test_filename(self, filename: str) -> str:
+        return filename.strip().lower()
+
+
+    # @brief Returns the path of the snapshot of a given file
+    #
+    # @details A snapshot is a copy of the file as it was the last time
+    #          tests were generated for it. It is used in patch mode to
+    #          send only the changes made to the file since then.
+    #
+    #          Snapshots are named after the hash of the file path, so
+    #          files with the same name in different directories don't clash.
+    #
+    # @param file Path to the file
+    # @return Path to the snapshot
+    def __get_snapshot_path(self, file: str) -> str:
+        return self.stest_environment_root + DIR_SEPARATOR + SNAPSHOTS_DIR + DIR_SEPARATOR + utils.get_string_hash(file)
+
+
+    # @brief Checks if a snapshot exists for a given file
+    # @param file Path to the file
+    # @return True if the snapshot exists, False otherwise
+    def __file_has_snapshot(self, file: str) -> bool:
+        return os.path.exists(self.__get_snapshot_path(file))
+
+
+    # @brief Saves the current content of a file as its snapshot
+    # @param file Path to the file
+    @profiler.timed("snapshot save")
+    def __save_snapshot(self, file: str) -> None:
+        utils.create_dir(self.stest_environment_root + DIR_SEPARATOR + SNAPSHOTS_DIR)
+        with open(self.__get_snapshot_path(file), "w") as f:
+            f.write(utils.get_file_content(file))
+
+
+    # @brief Returns the model interface for a given task
+    #
+    # @details Each task can be routed to a different provider (e.g. the
+    #          language check to a fast local model) through the 'routing'
+    #          section of the config file (check providers.py for details).
+    #          Interfaces are created once per task, after the config is loaded.
+    #
+    # @param task Task to get the interface for (providers.TASK_*)
+    # @return The model interface
+    def __get_openai_iface(self, task: str) -> IOpenAI:
+        if task not in self.openai_ifaces:
+            self.openai_ifaces[task] = IOpenAI(**providers.get_task_provider(task, self.config))
+
+        return self.openai_ifaces[task]
 
 
     # @brief Checks if a given directory is a stest environment
@@ -269,6 +553,7 @@ class Stest:
 
     # @brief Loads the config file
     # @param path Path to the config file
+    @profiler.timed("config load")
     def __load_config_file(self, path: str) -> None:
         with open(path, "r") as f:
             self.config = json.load(f)
@@ -276,6 +561,7 @@ class Stest:
 
     # @brief Saves the config file
     # @param path Path to the config file
+    @profiler.timed("config save")
     def __save_config_file(self, path: str) -> None:
         with open(path, "w") as f:
             json.dump(self.config, f, indent=4)
@@ -294,6 +580,7 @@ class Stest:
     #          or None if the stest environment could not be found.
     #
     # @return Path to the stest environment root or None if the stest environment could not be found
+    @profiler.timed("environment discovery")
     def __fetch_stest_environment_root(self) -> str:
         cwd = os.getcwd()
         for _ in range(MAX_PARENT_SEARCH_DEPTH):
@@ -326,10 +613,11 @@ class Stest:
     # @param file Path to the file
     # @param language Language to check
     # @return True if the content of the file matches the language, False otherwise
+    @profiler.timed("language check")
     def __file_content_matches_language(self, file: str, language: str) -> bool:
         initial_prompt = prompts.CHECK_FILE_LANGUAGE_PROMPT.replace("{language}", language)
         file_content = utils.get_file_content(file)
-        response = self.openai_iface.send_data_in_chunks_and_get_response(initial_prompt, file_content)
+        response = self.__get_openai_iface(providers.TASK_LANGUAGE_CHECK).send_data_in_chunks_and_get_response(initial_prompt, file_content)
         return response[:3] == "Yes"
 
 
@@ -360,6 +648,7 @@ class Stest:
      
     # @brief Tracks all files in a given directory
     # @param directory Path to the directory
+    @profiler.timed("directory walk")
     def __track_all_files_in_directory(self, input_dir: str) -> None:
         for root, dirs, files in os.walk(input_dir):
             for file in files:
@@ -385,6 +674,7 @@ class Stest:
 
     # @brief Untracks all files in a given directory
     # @param directory Path to the directory
+    @profiler.timed("directory walk")
     def __untrack_all_files_in_directory(self, directory) -> None:
         for root, dirs, files in os.walk(directory):
             for file in files:
@@ -404,13 +694,44 @@ class Stest:
     #          formatted in a way that Chat GPT can understand and parse.
     #          (check prompts.py/CREATE_TESTS_PROMPT for details)
     #
+    #          If minify_sources is set, the file content is reduced first
+    #          (check minify.py for details) and the tokens saved are reported.
+    #
     # @param path Path to the file
+    # @param minify_sources Whether to minify the file content
     # @return Serialized data for the file
-    def __build_serialized_file_data(self, path: str) -> str:
+    def __build_serialized_file_data(self, path: str, minify_sources: bool = False) -> str:
         file_content = utils.get_file_content(path)
+        if minify_sources:
+            file_content = self.__minify_file_content(path, file_content)
+
         return FILE_START_DELIMITER + "\n" + utils.get_filename(path) + file_content + "\n"
 
 
+    # @brief Minifies the content of a file and reports the tokens saved
+    #
+    # @details Files that cannot be minified safely (the minified source
+    #          does not verify) are sent as they are.
+    #
+    # @param path Path to the file
+    # @param file_content Content of the file
+    # @return Minified content of the file
+    @profiler.timed("minification")
+    def __minify_file_content(self, path: str, file_content: str) -> str:
+        relative_path = utils.absolute_path_to_relative_path(path)
+        result = minify.minify(file_content, self.config["language"])
+        if not result.minified:
+            print(f"  {Fore.YELLOW}{relative_path}: could not be minified, sending as is.{Style.RESET_ALL}")
+            return file_content
+
+        openai_iface = self.__get_openai_iface(providers.TASK_CREATE_TESTS)
+        original_tokens = openai_iface.count_tokens(file_content)
+        minified_tokens = openai_iface.count_tokens(result.content)
+        saved_tokens = original_tokens - minified_tokens
+        print(f"  {relative_path}: saved {Fore.LIGHTBLACK_EX}{saved_tokens}{Style.RESET_ALL} of {original_tokens} tokens.")
+        return result.content
+
+
     # @brief Builds the serialized data for a file that was previously tested
     #
     # @details The serialized data for a file that was previously tested
@@ -424,17 +745,186 @@ class Stest:
         return PREV_TEST_FILE_START_DELIMITER + "\n" + utils.get_filename(path) + file_content + "\n"
 
 
-    # @brief Saves the returned tests from Chat GPT into a file
+    # @brief Builds the serialized diff of a file since its snapshot
     #
-    # @details The returned tests from Chat GPT are a list of strings
-    #          that represent the tests that were generated for a given file.
-    #          
-    #          The output is formatted in the same way as the serialized data
-    #          that was sent to Chat GPT. (check prompts.py/CREATE_TESTS_PROMPT for details)
+    # @details Same format as __build_serialized_file_data, but the content
+    #          is the unified diff between the snapshot and the current file.
+    #          (check prompts.py/CREATE_TESTS_PATCH_PROMPT for details)
     #
     # @param path Path to the file
-    # @param data Data to save
-    def __save_serialized_test_data(self, path: str, data: str) -> None:
+    # @return Serialized diff for the file
+    def __build_serialized_file_diff_data(self, path: str) -> str:
+        filename = utils.get_filename(path)
+        snapshot_content = utils.get_file_content(self.__get_snapshot_path(path))
+        diff = patch.build_unified_diff(snapshot_content, utils.get_file_content(path), filename)
+        return FILE_START_DELIMITER + "\n" + filename + "\n" + diff + "\n"
+
+
+    # @brief Builds the serialized data for the current test file of a file
+    # @param path Path to the file (not the test file)
+    # @return Serialized data for the test file
+    def __build_serialized_test_file_data(self, path: str) -> str:
+        test_file = self.__get_test_file_path(path)
+        file_content = utils.get_file_content(test_file)
+        return PREV_TEST_FILE_START_DELIMITER + "\n" + utils.get_filename(test_file) + "\n" + file_content + "\n"
+
+
+    # @brief Generates the tests of the given files with a single request
+    #
+    # @details The request, each part of the response and each test file
+    #          written are recorded in the journal as soon as they happen.
+    #
+    # @param files Paths to the files
+    # @param previous_test_files Paths to the files (among files) that already have tests
+    # @param minify_sources Whether to minify the files before sending them
+    # @param partial_response Start of the response received by an interrupted run, if any
+    # @return List of the files whose tests were not written
+    def __generate_tests(
+            self,
+            files: list[str],
+            previous_test_files: list[str],
+            minify_sources: bool,
+            partial_response: str = None
+    ) -> list[str]:
+        with profiler.phase("payload building"):
+            data_to_send = ""
+            for file in files:
+                data_to_send += self.__build_serialized_file_data(file, minify_sources)
+
+            for file in previous_test_files:
+                data_to_send += self.__build_serialized_previous_test_file_data(file)
+
+        prompt_to_use = None
+        if len(previous_test_files) > 0:
+            prompt_to_use = prompts.CREATE_TESTS_REFACTOR_PROMPT
+        else:
+            prompt_to_use = prompts.CREATE_TESTS_PROMPT
+
+        request_digest = utils.get_string_hash(prompt_to_use + data_to_send)
+        self.__record_request(request_digest, "generate", files)
+        if partial_response:
+            self.journal.record_response_part(request_digest, partial_response)
+
+        openai_iface = self.__get_openai_iface(providers.TASK_CREATE_TESTS)
+        openai_iface.clear_message_history()
+        response = openai_iface.send_data_in_chunks_and_get_response(
+            prompt_to_use,
+            data_to_send,
+            partial_response,
+            lambda part: self.journal.record_response_part(request_digest, part)
+        )
+        truncated = openai_iface.truncated
+        response_digest = self.journal.record_response(request_digest, response, truncated)
+
+        if truncated:
+            print(f"{Fore.YELLOW}The response was cut off, the last test file will be discarded.{Style.RESET_ALL}")
+
+        utils.create_dir(self.config["test_dir"])
+        written_test_files = {}
+        for test_file in self.__save_serialized_test_data(self.config["test_dir"], response, truncated):
+            written_test_files[self.__normalize_test_filename(utils.get_filename(test_file))] = test_file
+
+        unfinished_files = []
+        for file in files:
+            expected_filename = utils.get_filename(self.__get_test_file_path(file))
+            test_file = written_test_files.get(self.__normalize_test_filename(expected_filename))
+            if test_file is not None:
+                self.journal.record_file(
+                    file, self.config["tracked_files"][file]["hash"], request_digest, response_digest, test_file
+                )
+            else:
+                unfinished_files.append(file)
+
+        return unfinished_files
+
+
+    # @brief Updates the test files of the given files by patching them,
+    #        with a single request
+    #
+    # @details Sends the diff of each file since its snapshot along with its
+    #          current test file and asks Chat GPT for a unified diff against
+    #          the test file, which is then applied locally. Output tokens are
+    #          the slowest part of a completion, so this is much faster than
+    #          having the whole test file re-emitted for a small change.
+    #
+    #          Files whose patch is missing or does not apply cleanly are
+    #          left untouched; the caller regenerates their tests in full.
+    #
+    # @param files Paths to the files (must have a test file and a snapshot),
+    #        at most FILES_PER_REQUEST
+    # @return List of the files whose test file was patched
+    def __patch_tests(self, files: list[str]) -> list[str]:
+        with profiler.phase("payload building"):
+            data_to_send = ""
+            for file in files:
+                data_to_send += self.__build_serialized_file_diff_data(file)
+
+            for file in files:
+                data_to_send += self.__build_serialized_test_file_data(file)
+
+        prompt = prompts.CREATE_TESTS_PATCH_PROMPT \
+            .replace("{language}", self.config["language"]) \
+            .replace("{test_framework}", self.config["test_framework"])
+
+        request_digest = utils.get_string_hash(prompt + data_to_send)
+        self.__record_request(request_digest, "patch", files)
+
+        openai_iface = self.__get_openai_iface(providers.TASK_CREATE_TESTS)
+        openai_iface.clear_message_history()
+        response = openai_iface.send_data_in_chunks_and_get_response(
+            prompt,
+            data_to_send,
+            on_response_part=lambda part: self.journal.record_response_part(request_digest, part)
+        )
+        truncated = openai_iface.truncated
+        response_digest = self.journal.record_response(request_digest, response, truncated)
+
+        test_diffs = {}
+        for file in self.__parse_serialized_test_data(response, truncated):
+            test_diffs[self.__normalize_test_filename(file["name"])] = file["content"]
+
+        patched_files = []
+        for file in files:
+            test_file = self.__get_test_file_path(file)
+            relative_path = utils.absolute_path_to_relative_path(test_file)
+            diff = test_diffs.get(self.__normalize_test_filename(utils.get_filename(test_file)))
+            if diff is None:
+                print(f"  {Fore.YELLOW}{relative_path}: no patch was returned, regenerating.{Style.RESET_ALL}")
+                continue
+
+            try:
+                with profiler.phase("patch applying"):
+                    patched_content = patch.apply_unified_diff(utils.get_file_content(test_file), diff)
+            except ValueError as e:
+                print(f"  {Fore.YELLOW}{relative_path}: patch does not apply ({e}), regenerating.{Style.RESET_ALL}")
+                continue
+
+            with profiler.phase("output writing"):
+                with open(test_file, "w") as f:
+                    f.write(patched_content)
+
+            self.journal.record_file(
+                file, self.config["tracked_files"][file]["hash"], request_digest, response_digest, test_file
+            )
+            print(f"  {relative_path}: patched.")
+            patched_files.append(file)
+
+        return patched_files
+
+
+    # @brief Parses the returned tests from Chat GPT
+    #
+    # @details The output is formatted in the same way as the serialized data
+    #          that was sent to Chat GPT. (check prompts.py/CREATE_TESTS_PROMPT for details)
+    #
+    #          If the response was cut off, the last file is incomplete and
+    #          is left out.
+    #
+    # @param data Data returned by Chat GPT
+    # @param truncated Whether the response was cut off
+    # @return List of files ({"name", "content"})
+    @profiler.timed("output parsing")
+    def __parse_serialized_test_data(self, data: str, truncated: bool = False) -> list[dict]:
         files = []
 
         # I've had to change this to a more complex regex because
@@ -450,7 +940,7 @@ class Stest:
                 continue
             
             lines = file_data.split("\n")
-            file_name = lines[1]
+            file_name = lines[1].strip()
             file_content = "\n".join(lines[2:])
 
             filtered_file_content = re.sub(pattern, r'\1', file_content)
@@ -460,9 +950,226 @@ class Stest:
                 "content": filtered_file_content
             })
 
+        if truncated and len(files) > 0:
+            files.pop()
+
+        return files
+
+
+    # @brief Saves the returned tests from Chat GPT into a file
+    #
+    # @details The returned tests from Chat GPT are a list of strings
+    #          that represent the tests that were generated for a given file.
+    #          
+    #          The output is formatted in the same way as the serialized data
+    #          that was sent to Chat GPT. (check prompts.py/CREATE_TESTS_PROMPT for details)
+    #
+    # @param path Path to the file
+    # @param data Data to save
+    # @param truncated Whether the response was cut off
+    # @return List of paths to the written test files
+    @profiler.timed("output writing")
+    def __save_serialized_test_data(self, path: str, data: str, truncated: bool = False) -> list[str]:
+        files = self.__parse_serialized_test_data(data, truncated)
+        written_files = []
+
         for file in files:
             file_path = path + DIR_SEPARATOR + file["name"]
             with open(file_path, "w") as f:
                 f.write(file["content"])
- 
 
+            written_files.append(file_path)
+
+        return written_files
+
+
+    # @brief Returns the given path relative to the stest environment
+    #
+    # @details Tracked files are stored with absolute paths, which differ
+    #          between machines (e.g. CI nodes). Shards are computed and
+    #          stored with these relative paths instead, always using '/'.
+    #
+    # @param path Absolute path
+    # @return Relative path
+    def __get_environment_relative_path(self, path: str) -> str:
+        environment_dir = os.path.dirname(self.stest_environment_root)
+        return os.path.relpath(path, environment_dir).replace(os.sep, "/")
+
+
+    # @brief Selects the files that belong to the given shard
+    #
+    # @param files Paths to the files that need tests
+    # @param shard_spec Shard specification ("i/N")
+    # @param shard_strategy "hash" to assign files by path, "weight" to
+    #        balance the number of tokens between the shards
+    # @return Paths to the files of the shard
+    def __select_shard_files(self, files: list[str], shard_spec: str, shard_strategy: str) -> list[str]:
+        index, count = shard.parse_shard_spec(shard_spec)
+
+        relative_paths = {}
+        for file in files:
+            relative_paths[file] = self.__get_environment_relative_path(file)
+
+        if shard_strategy == "weight":
+            openai_iface = self.__get_openai_iface(providers.TASK_CREATE_TESTS)
+            weights = {}
+            for file in files:
+                weights[relative_paths[file]] = openai_iface.count_tokens(utils.get_file_content(file))
+
+            shards = shard.assign_by_weight(weights, count)
+        else:
+            shards = shard.assign_by_hash(list(relative_paths.values()), count)
+
+        return [file for file in files if shards[relative_paths[file]] == index]
+
+
+    # @brief Saves the results of a sharded run into its shard file
+    #
+    # @details The shard file holds the new hashes and the test files of the
+    #          shard's files, with paths relative to the stest environment.
+    #          Each file entry names its test file ("test_file"), so that
+    #          only the tests of tracked files are merged.
+    #          (check merge_shards for details)
+    #
+    # @param shard_spec Shard specification ("i/N")
+    # @param files Paths to the files of the shard
+    def __save_shard_file(self, shard_spec: str, files: list[str]) -> None:
+        index, count = shard.parse_shard_spec(shard_spec)
+        shard_data = {
+            "shard": index,
+            "shards": count,
+            "tracked_files": {},
+            "tests": {}
+        }
+
+        for file in files:
+            entry = {
+                "hash": self.config["tracked_files"][file]["hash"]
+            }
+
+            test_file = self.__get_test_file_path(file)
+            if os.path.exists(test_file):
+                relative_test_file = self.__get_environment_relative_path(test_file)
+                entry["test_file"] = relative_test_file
+                shard_data["tests"][relative_test_file] = utils.get_file_content(test_file)
+
+            shard_data["tracked_files"][self.__get_environment_relative_path(file)] = entry
+
+        shards_dir = self.stest_environment_root + DIR_SEPARATOR + SHARDS_DIR
+        utils.create_dir(shards_dir)
+        shard_file = shards_dir + DIR_SEPARATOR + f"shard-{index}-of-{count}.json"
+        with open(shard_file, "w") as f:
+            json.dump(shard_data, f, indent=4)
+
+        print(f"Shard results have been written to {Fore.LIGHTBLACK_EX}{utils.absolute_path_to_relative_path(shard_file)}{Style.RESET_ALL}. Use 'stest merge-shards' to merge them.")
+
+
+    # @brief Records a request in the progress journal
+    # @param request_digest Digest of the prompt and data sent
+    # @param mode "generate" or "patch" (check journal.py for details)
+    # @param files Paths to the files in the request
+    def __record_request(self, request_digest: str, mode: str, files: list[str]) -> None:
+        file_hashes = {}
+        for file in files:
+            file_hashes[file] = self.config["tracked_files"][file]["hash"]
+
+        self.journal.record_request(request_digest, mode, file_hashes)
+
+
+    # @brief Returns the requests of an interrupted run that got a partial response
+    #
+    # @details Such a request is continued from its partial response rather
+    #          than sent again, provided none of its files has changed since.
+    #          Only full test generation requests are continued.
+    #
+    # @param files Paths to the files that still need tests
+    # @return List of requests ({"files", "partial_response"})
+    def __get_partial_requests(self, files: list[str]) -> list[dict]:
+        journal = self.journal.load()
+        requests = []
+        requested_files = []
+
+        for request in journal["requests"].values():
+            if request["mode"] != "generate" or request["response"] is not None or len(request["parts"]) == 0:
+                continue
+
+            if any(
+                    file not in files
+                    or file in requested_files
+                    or file_hash != self.config["tracked_files"][file]["hash"]
+                    for file, file_hash in request["files"].items()
+            ):
+                continue
+
+            requests.append({
+                "files": list(request["files"]),
+                "partial_response": "".join(request["parts"])
+            })
+            requested_files += list(request["files"])
+
+        return requests
+
+
+    # @brief Replays the work finished by an interrupted create-tests run
+    #
+    # @details A file is done if the journal records a test file written for
+    #          its current content and that test file has not changed since.
+    #
+    #          Responses that were received but whose test files were never
+    #          written (the run was interrupted in between) are written now,
+    #          instead of being requested again. This is only done for full
+    #          test files; patches are not replayed since the test file they
+    #          apply to may already have been modified.
+    #
+    # @param files Paths to the files that need tests
+    # @return List of the files that are done
+    @profiler.timed("journal replay")
+    def __replay_journal(self, files: list[str]) -> list[str]:
+        journal = self.journal.load()
+        replayed_files = []
+
+        for file in files:
+            entry = journal["files"].get(file)
+            if entry is None or entry["hash"] != self.config["tracked_files"][file]["hash"]:
+                continue
+            if not os.path.exists(entry["output"]) or utils.get_file_hash(entry["output"]) != entry["output_digest"]:
+                continue
+
+            replayed_files.append(file)
+
+        for request_digest, request in journal["requests"].items():
+            if request["mode"] != "generate" or request["response"] is None:
+                continue
+
+            pending_files = [
+                file for file, file_hash in request["files"].items()
+                if file in files
+                and file not in replayed_files
+                and file_hash == self.config["tracked_files"][file]["hash"]
+            ]
+            if len(pending_files) == 0:
+                continue
+
+            response = self.journal.get_response(request["response"])
+            test_files = {}
+            for test_file in self.__parse_serialized_test_data(response, request["truncated"]):
+                test_files[self.__normalize_test_filename(test_file["name"])] = test_file
+
+            utils.create_dir(self.config["test_dir"])
+            for file in pending_files:
+                expected_filename = utils.get_filename(self.__get_test_file_path(file))
+                returned_file = test_files.get(self.__normalize_test_filename(expected_filename))
+                if returned_file is None:
+                    continue
+
+                # Written under the returned name, like __save_serialized_test_data does
+                test_file = self.config["test_dir"] + DIR_SEPARATOR + returned_file["name"]
+                with open(test_file, "w") as f:
+                    f.write(returned_file["content"])
+
+                self.journal.record_file(
+                    file, self.config["tracked_files"][file]["hash"], request_digest, request["response"], test_file
+                )
+                replayed_files.append(file)
+
+        return replayed_files
@@ -1,6 +1,9 @@
 import os
 import hashlib
 
+# Local imports
+from . import profiler
+
 
 # @brief Create a directory if it does not exist
 # @param path Path to the directory
@@ -12,6 +15,7 @@ def create_dir(path: str) -> None:
 # @brief Returns the SHA-256 hash of the given file
 # @param file Path to the file
 # @return hash_digest
+@profiler.timed("hashing")
 def get_file_hash(file: str) -> str:
     with open(file, "rb") as f:
         bytes = f.read()
@@ -19,6 +23,13 @@ def get_file_hash(file: str) -> str:
         return digest
 
 
+# @brief Returns the SHA-256 hash of the given string
+# @param string String to hash
+# @return hash_digest
+def get_string_hash(string: str) -> str:
+    return hashlib.sha256(string.encode("utf-8")).hexdigest()
+
+
 # @brief Returns the content of the given file
 # @param file Path to the file
 # @return content
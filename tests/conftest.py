@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+
+from types import SimpleNamespace
+
+import pytest
+
+# stest is not installed as a package, make src/ importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from stest import prompts
+from stest import providers
+from stest.openai_iface import IOpenAI
+
+
+# @brief Creates an empty Python stest environment and runs the test from it
+# @return Path to the environment
+@pytest.fixture
+def stest_environment(tmp_path, monkeypatch):
+    (tmp_path / ".stest").mkdir()
+    (tmp_path / "tests").mkdir()
+
+    config = {
+        "tracked_files": {},
+        "language": "py",
+        "test_framework": "pytest",
+        "test_dir": str(tmp_path / "tests"),
+        "providers": {},
+        "routing": {}
+    }
+    (tmp_path / ".stest" / "config.json").write_text(json.dumps(config))
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+# @brief Returns a function that creates source files and tracks them
+@pytest.fixture
+def track_files(stest_environment):
+    def track(files: dict[str, str]) -> None:
+        config_file = stest_environment / ".stest" / "config.json"
+        config = json.loads(config_file.read_text())
+        for name, content in files.items():
+            (stest_environment / name).write_text(content)
+            config["tracked_files"][str(stest_environment / name)] = {"hash": ""}
+
+        config_file.write_text(json.dumps(config))
+
+    return track
+
+
+# @brief Chat completions client that returns scripted replies
+#
+# @details Only the messages that ask for an answer (all the parts were
+#          sent, or the response must be continued) consume a reply, the
+#          chunks of data are acknowledged with "OK". A reply is a tuple
+#          (content, finish_reason).
+class FakeClient:
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, messages: list[dict], model: str, max_tokens: int):
+        self.requests.append([dict(message) for message in messages])
+        if messages[-1]["content"] in (prompts.ALL_PARTS_SENT_PROMPT, prompts.CONTINUE_RESPONSE_PROMPT):
+            content, finish_reason = self.replies.pop(0)
+        else:
+            content, finish_reason = "OK", "stop"
+
+        return SimpleNamespace(choices=[
+            SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)
+        ])
+
+
+# @brief Makes every model interface use a FakeClient
+# @return The FakeClient
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(providers, "get_client", lambda *args, **kwargs: client)
+    # Token counts only matter for trimming, don't load tiktoken encodings
+    monkeypatch.setattr(IOpenAI, "count_tokens", lambda self, text: len(text.split()))
+    return client
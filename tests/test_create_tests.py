@@ -0,0 +1,53 @@
+import json
+
+from stest.stest import FILE_START_DELIMITER, Stest
+
+
+# @brief Builds a response in the format of prompts.py/CREATE_TESTS_PROMPT
+def serialized_test_file(name: str, content: str) -> str:
+    return FILE_START_DELIMITER + "\n" + name + "\n```python\n" + content + "```\n"
+
+
+# @brief Returns the hash stored in the config file for a file of the environment
+def stored_hash(environment, name: str) -> str:
+    config = json.loads((environment / ".stest" / "config.json").read_text())
+    return config["tracked_files"][str(environment / name)]["hash"]
+
+
+def test_create_tests(stest_environment, track_files, fake_client):
+    track_files({"car.py": "class Car:\n    pass\n"})
+    fake_client.replies = [(serialized_test_file("test_car.py", "def test_car():\n    pass\n"), "stop")]
+
+    Stest().create_tests()
+
+    assert (stest_environment / "tests" / "test_car.py").read_text() == "def test_car():\n    pass\n"
+    assert stored_hash(stest_environment, "car.py") != ""
+    assert not (stest_environment / ".stest" / "journal").exists()
+
+
+def test_test_file_name_case_differs_from_file(stest_environment, track_files, fake_client):
+    track_files({"MyClass.py": "class MyClass:\n    pass\n"})
+    fake_client.replies = [(serialized_test_file("test_myclass.py", "def test_my_class():\n    pass\n"), "stop")]
+
+    Stest().create_tests()
+
+    assert (stest_environment / "tests" / "test_myclass.py").exists()
+    assert stored_hash(stest_environment, "MyClass.py") != ""
+    assert not (stest_environment / ".stest" / "journal").exists()
+
+
+def test_truncated_response_drops_last_file_and_restores_its_hash(stest_environment, track_files, fake_client):
+    track_files({"a.py": "a = 1\n", "b.py": "b = 1\n"})
+    fake_client.replies = [
+        (FILE_START_DELIMITER + "\ntest_a.py\ndef test_a():\n", "length"),
+        ("    pass\n" + FILE_START_DELIMITER + "\ntest_b.py\n", "length"),
+        ("def test_b():\n", "length"),
+        ("    pa", "length")
+    ]
+
+    Stest().create_tests()
+
+    assert (stest_environment / "tests" / "test_a.py").read_text() == "def test_a():\n    pass\n"
+    assert not (stest_environment / "tests" / "test_b.py").exists()
+    assert stored_hash(stest_environment, "a.py") != ""
+    assert stored_hash(stest_environment, "b.py") == ""
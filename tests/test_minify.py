@@ -0,0 +1,153 @@
+import ast
+import re
+
+from stest import minify
+
+
+# @brief Returns the original line number of each line of a minified source
+def original_line_numbers(content: str) -> list[int]:
+    numbers = []
+    number = 1
+    for line in content.splitlines():
+        marker = re.fullmatch(r'(?:#|//) line (\d+)', line)
+        if marker:
+            number = int(marker.group(1))
+            numbers.append(None)
+            continue
+
+        numbers.append(number)
+        number += 1
+
+    return numbers
+
+
+# @brief Checks that each minified line starts like the original line it maps to
+def assert_line_numbers_preserved(original: str, minified: str) -> None:
+    original_lines = original.splitlines()
+    for line, number in zip(minified.splitlines(), original_line_numbers(minified)):
+        if number is not None and line.strip() != "":
+            assert original_lines[number - 1].strip().startswith(line.split()[0])
+
+
+def test_python_comments_and_docstrings_are_removed():
+    source = (
+        "# License banner\n"
+        "# spanning lines\n"
+        "\n"
+        "\n"
+        "\n"
+        "def add(a, b):\n"
+        "    \"\"\"Adds two numbers.\n"
+        "\n"
+        "    Long description.\n"
+        "    \"\"\"\n"
+        "    return a + b  # inline comment\n"
+    )
+
+    result = minify.minify(source, "py")
+
+    assert result.minified
+    assert "License" not in result.content
+    assert "inline comment" not in result.content
+    assert "Long description" not in result.content
+    assert "'Adds two numbers.'" in result.content
+    ast.parse(result.content)
+
+
+def test_python_line_numbers_are_kept():
+    source = "# a\n# b\n# c\n# d\n# e\nimport os\n\n\ndef f():\n    # comment\n    return os.sep\n"
+
+    result = minify.minify(source, "py")
+
+    assert result.content.startswith("# line 6\nimport os\n")
+    assert_line_numbers_preserved(source, result.content)
+
+
+def test_python_multiline_strings_are_untouched():
+    source = "x = \"\"\"a\n\n\n\n\nb\"\"\"\n"
+
+    result = minify.minify(source, "py")
+
+    assert ast.literal_eval(result.content.split("=", 1)[1].strip()) == "a\n\n\n\n\nb"
+
+
+def test_python_form_feed_does_not_shift_comments():
+    source = "a = 1\n\x0c\nz = 1; w = 2\ny = 1 # c\n"
+
+    result = minify.minify(source, "py")
+
+    assert "z = 1; w = 2\n" in result.content
+    assert "# c" not in result.content
+
+
+def test_python_changed_tokens_are_not_minified(monkeypatch):
+    source = "x = 1  # comment\ny = 2\n"
+    monkeypatch.setattr(minify, "_compact_blank_lines", lambda lines, keep, comment: "x = 1\n")
+
+    result = minify.minify(source, "py")
+
+    assert not result.minified
+    assert result.content == source
+
+
+def test_c_comments_are_removed():
+    source = (
+        "/* License\n"
+        " * banner\n"
+        " */\n"
+        "#include <stdio.h>\n"
+        "\n"
+        "// comment\n"
+        "int main() { char *s = \"// not a comment\"; /* x */ return 0; }\n"
+    )
+
+    result = minify.minify(source, "c")
+
+    assert result.minified
+    assert "License" not in result.content
+    assert "\"// not a comment\"" in result.content
+    assert "/* x */" not in result.content
+    assert_line_numbers_preserved(source, result.content)
+
+
+def test_c_line_comment_continued_by_backslash_is_not_minified():
+    source = "int a = 1; // c \\\nint b = 2;\nint c = 3;\n"
+
+    result = minify.minify(source, "c")
+
+    assert not result.minified
+    assert result.content == source
+
+
+def test_js_regex_literal_is_not_minified():
+    source = "var re = /[/*]/; // hi\nvar x = 1; /* c */ var y = \"a*/b\";\n"
+
+    result = minify.minify(source, "js")
+
+    assert not result.minified
+    assert result.content == source
+
+
+def test_js_regex_after_keyword_is_not_minified():
+    source = "function f(s) {\n    return /a\\/\\/b/.test(s); // c\n}\n"
+
+    result = minify.minify(source, "js")
+
+    assert not result.minified
+
+
+def test_js_division_is_minified():
+    source = "// comment\nvar half = total / 2; // half\nvar ratio = (a) / b;\n"
+
+    result = minify.minify(source, "js")
+
+    assert result.minified
+    assert "comment" not in result.content
+    assert "var half = total / 2;" in result.content
+
+
+def test_unsupported_language_is_unchanged():
+    result = minify.minify("# not code", "rb")
+
+    assert not result.minified
+    assert result.content == "# not code"
@@ -0,0 +1,53 @@
+from stest import openai_iface
+from stest import prompts
+from stest.openai_iface import IOpenAI
+
+
+# @brief Returns the number of times the model was asked to continue
+def continuation_requests(client) -> int:
+    return sum(1 for messages in client.requests if messages[-1]["content"] == prompts.CONTINUE_RESPONSE_PROMPT)
+
+
+def test_complete_response_is_not_continued(fake_client):
+    fake_client.replies = [("whole", "stop")]
+    iface = IOpenAI()
+
+    assert iface.send_data_in_chunks_and_get_response("prompt", "data") == "whole"
+    assert not iface.truncated
+    assert continuation_requests(fake_client) == 0
+
+
+def test_cut_off_response_parts_are_stitched(fake_client):
+    fake_client.replies = [("first ", "length"), ("second ", "length"), ("third", "stop")]
+    parts = []
+    iface = IOpenAI()
+
+    response = iface.send_data_in_chunks_and_get_response("prompt", "data", on_response_part=parts.append)
+
+    assert response == "first second third"
+    assert parts == ["first ", "second ", "third"]
+    assert not iface.truncated
+    # The model is given back the part it is continuing
+    assert fake_client.requests[-1][-2] == {"role": "assistant", "content": "second "}
+
+
+def test_continuations_stop_after_max_continuations(fake_client):
+    fake_client.replies = [("part ", "length")] * (openai_iface.MAX_CONTINUATIONS + 2)
+    iface = IOpenAI()
+
+    response = iface.send_data_in_chunks_and_get_response("prompt", "data")
+
+    assert response == "part " * (openai_iface.MAX_CONTINUATIONS + 1)
+    assert iface.truncated
+    assert continuation_requests(fake_client) == openai_iface.MAX_CONTINUATIONS
+
+
+def test_partial_response_is_continued(fake_client):
+    fake_client.replies = [("end", "stop")]
+    iface = IOpenAI()
+
+    response = iface.send_data_in_chunks_and_get_response("prompt", "data", partial_response="start ")
+
+    assert response == "start end"
+    assert continuation_requests(fake_client) == 1
+    assert fake_client.requests[-1][-2] == {"role": "assistant", "content": "start "}
@@ -0,0 +1,85 @@
+import pytest
+
+from stest import patch
+
+
+OLD_TEST_FILE = (
+    "import pytest\n"
+    "\n"
+    "from car import Car\n"
+    "\n"
+    "\n"
+    "def test_drive():\n"
+    "    car = Car()\n"
+    "    assert car.drive() == 1\n"
+)
+
+
+def test_round_trip_with_built_diff():
+    new = OLD_TEST_FILE.replace("== 1", "== 2") + "\n\ndef test_stop():\n    assert Car().stop() is None\n"
+    diff = patch.build_unified_diff(OLD_TEST_FILE, new, "test_car.py")
+
+    assert patch.apply_unified_diff(OLD_TEST_FILE, diff) == new
+
+
+def test_wrong_line_hint_is_found_by_context():
+    diff = (
+        "@@ -40,3 +40,3 @@\n"
+        " def test_drive():\n"
+        "     car = Car()\n"
+        "-    assert car.drive() == 1\n"
+        "+    assert car.drive() == 2\n"
+    )
+
+    patched = patch.apply_unified_diff(OLD_TEST_FILE, diff)
+
+    assert patched == OLD_TEST_FILE.replace("== 1", "== 2")
+
+
+def test_blank_context_lines_without_leading_space():
+    diff = (
+        "@@ -3,4 +3,4 @@\n"
+        "-from car import Car\n"
+        "+from car import Car, Truck\n"
+        "\n"
+        "\n"
+        " def test_drive():\n"
+    )
+
+    patched = patch.apply_unified_diff(OLD_TEST_FILE, diff)
+
+    assert patched == OLD_TEST_FILE.replace("import Car\n", "import Car, Truck\n")
+
+
+def test_no_newline_marker():
+    old = "a = 1\nb = 2"
+    new = "a = 1\nb = 3"
+    diff = patch.build_unified_diff(old, new, "test_a.py")
+
+    assert "\\ No newline at end of file" in diff
+    assert patch.apply_unified_diff(old, diff) == new
+
+
+def test_no_newline_marker_on_removed_line_only():
+    old = "a = 1\nb = 2"
+    new = "a = 1\nb = 2\n"
+    diff = patch.build_unified_diff(old, new, "test_a.py")
+
+    assert patch.apply_unified_diff(old, diff) == new
+
+
+def test_hunk_that_does_not_apply_raises():
+    diff = (
+        "@@ -6,2 +6,2 @@\n"
+        " def test_fly():\n"
+        "-    assert False\n"
+        "+    assert True\n"
+    )
+
+    with pytest.raises(ValueError):
+        patch.apply_unified_diff(OLD_TEST_FILE, diff)
+
+
+def test_malformed_diff_raises():
+    with pytest.raises(ValueError):
+        patch.apply_unified_diff(OLD_TEST_FILE, "this is not a diff\n")
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from stest import providers
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    # Read the .env files again, from an empty project
+    monkeypatch.setattr(providers, "_environment", None)
+    monkeypatch.chdir(tmp_path)
+    for name in list(os.environ):
+        if name.startswith(providers.ENV_PREFIX):
+            monkeypatch.delenv(name)
+
+    return tmp_path
+
+
+def test_api_key_env_not_set_raises(monkeypatch):
+    monkeypatch.delenv("LOCAL_KEY", raising=False)
+    config = {"providers": {"local": {"model": "llama3", "api_key_env": "LOCAL_KEY"}}}
+
+    with pytest.raises(Exception, match=r"'LOCAL_KEY' \(providers.local.api_key_env\) is not set"):
+        providers.get_provider_settings("local", config)
+
+
+def test_api_key_env(monkeypatch):
+    monkeypatch.setenv("LOCAL_KEY", "secret")
+    config = {"providers": {"local": {"model": "llama3", "api_key_env": "LOCAL_KEY"}}}
+
+    assert providers.get_provider_settings("local", config)["api_key"] == "secret"
+
+
+def test_project_env_file_only_provides_stest_variables(environment):
+    (environment / ".env").write_text("BASE_URL=http://example.com\nSTEST_LOCAL_MODEL=llama3\n")
+
+    assert "base_url" not in providers.get_provider_settings(providers.DEFAULT_PROVIDER, {})
+    assert providers.get_provider_settings("local", {})["model"] == "llama3"
+
+
+def test_packaged_key_is_not_sent_to_project_endpoint(environment):
+    (environment / ".env").write_text("STEST_BASE_URL=http://localhost:8080/v1\n")
+
+    settings = providers.get_provider_settings(providers.DEFAULT_PROVIDER, {})
+
+    assert settings["base_url"] == "http://localhost:8080/v1"
+    assert settings["api_key"] == providers.PLACEHOLDER_API_KEY
+
+
+def test_invalid_value_raises(monkeypatch):
+    monkeypatch.setenv("STEST_TIMEOUT", "30s")
+
+    with pytest.raises(Exception, match="Invalid value '30s' for STEST_TIMEOUT"):
+        providers.get_provider_settings(providers.DEFAULT_PROVIDER, {})
+
+
+def test_task_routing(monkeypatch):
+    monkeypatch.setenv("STEST_LANGUAGE_CHECK_PROVIDER", "local")
+    config = {"providers": {"local": {"base_url": "http://localhost:8080/v1"}}}
+
+    settings = providers.get_task_provider(providers.TASK_LANGUAGE_CHECK, config)
+
+    assert settings["base_url"] == "http://localhost:8080/v1"
+    assert settings["api_key"] == providers.PLACEHOLDER_API_KEY
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from stest import shard
+from stest.stest import Stest
+
+
+def test_parse_shard_spec():
+    assert shard.parse_shard_spec("1/4") == (1, 4)
+    assert shard.parse_shard_spec("4/4") == (4, 4)
+
+
+@pytest.mark.parametrize("spec", ["0/4", "5/4", "1/0", "1-4", "a/4", "1/4/2", "-1/4"])
+def test_parse_shard_spec_rejects_invalid_specs(spec):
+    with pytest.raises(Exception, match="Invalid shard"):
+        shard.parse_shard_spec(spec)
+
+
+def test_assign_by_hash_is_stable():
+    keys = [f"src/module_{i}.py" for i in range(50)]
+
+    shards = shard.assign_by_hash(keys, 4)
+
+    assert set(shards.values()) <= {1, 2, 3, 4}
+    assert shard.assign_by_hash(list(reversed(keys)), 4) == shards
+    # A key does not move when other keys are added or removed
+    assert shard.assign_by_hash(keys[:10], 4) == {key: shards[key] for key in keys[:10]}
+
+
+def test_assign_by_weight_balances_shards():
+    weights = {"a.py": 10, "b.py": 7, "c.py": 5, "d.py": 4, "e.py": 3, "f.py": 1}
+
+    shards = shard.assign_by_weight(weights, 2)
+
+    loads = [sum(weight for key, weight in weights.items() if shards[key] == index) for index in (1, 2)]
+    assert sorted(loads) == [15, 15]
+    assert shard.assign_by_weight(dict(reversed(list(weights.items()))), 2) == shards
+
+
+def test_assign_by_weight_breaks_ties_by_key():
+    shards = shard.assign_by_weight({"b.py": 1, "a.py": 1, "c.py": 1}, 3)
+
+    assert shards == {"a.py": 1, "b.py": 2, "c.py": 3}
+
+
+# @brief Writes a shard file into .stest/shards/ and returns its path
+def write_shard_file(environment, index, count, tracked_files, tests):
+    shards_dir = environment / ".stest" / "shards"
+    shards_dir.mkdir(exist_ok=True)
+    path = shards_dir / f"shard-{index}-of-{count}.json"
+    path.write_text(json.dumps({
+        "shard": index,
+        "shards": count,
+        "tracked_files": tracked_files,
+        "tests": tests
+    }))
+
+    return path
+
+
+def test_merge_shards(stest_environment, track_files):
+    track_files({"a.py": "a = 1\n", "b.py": "b = 1\n"})
+    first = write_shard_file(stest_environment, 1, 2,
+        {"a.py": {"hash": "hash_a", "test_file": "tests/test_a.py"}}, {"tests/test_a.py": "def test_a(): pass\n"})
+    second = write_shard_file(stest_environment, 2, 2,
+        {"b.py": {"hash": "hash_b", "test_file": "tests/test_b.py"}}, {"tests/test_b.py": "def test_b(): pass\n"})
+
+    Stest().merge_shards([])
+
+    config = json.loads((stest_environment / ".stest" / "config.json").read_text())
+    assert config["tracked_files"][str(stest_environment / "a.py")]["hash"] == "hash_a"
+    assert config["tracked_files"][str(stest_environment / "b.py")]["hash"] == "hash_b"
+    assert (stest_environment / "tests" / "test_b.py").read_text() == "def test_b(): pass\n"
+    assert not first.exists() and not second.exists()
+
+
+def test_merge_shards_conflict_merges_nothing(stest_environment, track_files):
+    track_files({"a.py": "a = 1\n"})
+    write_shard_file(stest_environment, 1, 2,
+        {"a.py": {"hash": "hash_1", "test_file": "tests/test_a.py"}}, {"tests/test_a.py": "one\n"})
+    write_shard_file(stest_environment, 2, 2,
+        {"a.py": {"hash": "hash_2", "test_file": "tests/test_a.py"}}, {"tests/test_a.py": "two\n"})
+
+    with pytest.raises(Exception, match="Conflicting results"):
+        Stest().merge_shards([])
+
+    config = json.loads((stest_environment / ".stest" / "config.json").read_text())
+    assert config["tracked_files"][str(stest_environment / "a.py")]["hash"] == ""
+    assert not (stest_environment / "tests" / "test_a.py").exists()
+
+
+def test_merge_shards_ignores_tests_of_untracked_files(stest_environment, track_files):
+    track_files({"a.py": "a = 1\n"})
+    write_shard_file(stest_environment, 1, 1,
+        {"other.py": {"hash": "hash", "test_file": "tests/test_other.py"}}, {"tests/test_other.py": "other\n"})
+
+    Stest().merge_shards([])
+
+    assert not (stest_environment / "tests" / "test_other.py").exists()
+
+
+def test_merge_shards_keeps_files_outside_shards_dir(stest_environment, track_files):
+    track_files({"a.py": "a = 1\n"})
+    artifact = stest_environment / "artifact.json"
+    artifact.write_text(json.dumps({
+        "shard": 1,
+        "shards": 1,
+        "tracked_files": {"a.py": {"hash": "hash_a"}},
+        "tests": {}
+    }))
+
+    Stest().merge_shards([str(artifact)])
+
+    assert artifact.exists()